@@ -0,0 +1,82 @@
+"""Module to publish target files atomically
+
+A target is written under a temporary name in its own folder and then moved
+over the old target with os.replace, so a reader sees the old or the new file,
+never a partial one and never no file at all
+The temporary name doesn't end in .xml or .fms, it triggers no new events
+"""
+import itertools
+import logging
+import os
+import shutil
+
+FSYNC_NEVER = "never"
+FSYNC_FILE = "file"
+FSYNC_DIRECTORY = "directory"
+FSYNC_POLICIES = [FSYNC_NEVER, FSYNC_FILE, FSYNC_DIRECTORY]
+TEMP_SUFFIX = ".tmp"
+_COUNTER = itertools.count()
+
+
+def temporary_path(target):
+    """Unique hidden name next to target"""
+    return target.with_name(
+        f".{target.name}.{os.getpid()}.{next(_COUNTER)}{TEMP_SUFFIX}"
+    )
+
+
+def fsync_file(path):
+    """Flush the content of path to disk"""
+    with open(path, "rb+") as file:
+        os.fsync(file.fileno())
+
+
+def fsync_directory(path):
+    """Flush the directory entries of path to disk, not possible on windows"""
+    if os.name == "nt":
+        return
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _sync(path, target, fsync_policy):
+    if fsync_policy in (FSYNC_FILE, FSYNC_DIRECTORY):
+        fsync_file(path)
+    os.replace(path, target)
+    if fsync_policy == FSYNC_DIRECTORY:
+        fsync_directory(target.parent)
+
+
+def publish(target, write, fsync_policy=FSYNC_NEVER):
+    """
+    Let write(temporary_path) create the new content and replace target with it
+    Returns what write returns, the temporary file is removed when anything fails
+    """
+    temporary = temporary_path(target)
+    try:
+        result = write(temporary)
+        _sync(temporary, target, fsync_policy)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+    return result
+
+
+def replace(source, target, fsync_policy=FSYNC_NEVER):
+    """Move source over target in one step, source must be in the same file system"""
+    _sync(source, target, fsync_policy)
+
+
+def keep_copy(target, backup):
+    """Give target a second name, target itself stays in place"""
+    try:
+        os.link(target, backup)
+    except OSError as error:
+        logging.debug("Unable to link %s, copying: %s", backup, error)
+        shutil.copy2(target, backup)
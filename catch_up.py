@@ -0,0 +1,93 @@
+"""Module to find files that arrived while nothing was watching
+
+The modification time of the newest file when a folder was first watched is
+kept per folder in a small json file. When monitoring starts, newer files
+that are not in the journal of processed files are handled as if an event
+for them came in. The journal decides, a high-water mark would skip files
+that were queued, dropped or lost in a crash while a newer one got through
+"""
+import json
+import logging
+import os
+import pathlib
+import threading
+
+from atomic_publish import publish
+
+
+def find_new_files(folder, since=None, recursive=False, accepts=None):
+    """
+    (mtime_ns, path) of the files in folder modified after since, oldest first
+    accepts(path) filters on the name, before anything is stat'ed
+    """
+    found = []
+    folders = [os.fspath(folder)]
+    while folders:
+        current = folders.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                folders.append(entry.path)
+                            continue
+                        if accepts is not None and not accepts(entry.path):
+                            continue
+                        mtime = entry.stat().st_mtime_ns
+                    except OSError:
+                        # Gone between listing and stat
+                        continue
+                    if since is None or mtime > since:
+                        found.append((mtime, entry.path))
+        except OSError as error:
+            logging.warning("Unable to scan %s: %s", current, error)
+    found.sort()
+    return found
+
+
+class ProcessedMarker:
+    """Modification time (ns) of the newest file when a folder was first watched"""
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._marks = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return {folder: int(mark) for folder, mark in json.load(file).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as error:
+            logging.warning(
+                "Unable to read %s, no files are caught up: %s", self.path, error
+            )
+            return {}
+
+    @staticmethod
+    def key(folder):
+        """Folders are stored in one normalised form"""
+        return os.path.normpath(os.fspath(folder))
+
+    def get(self, folder):
+        """Marker of folder, None when the folder was never watched"""
+        return self._marks.get(self.key(folder))
+
+    def update(self, folder, mtime_ns) -> bool:
+        """Move the marker of folder forward and save it, returns False if it didn't move"""
+        key = self.key(folder)
+        with self._lock:
+            if key in self._marks and mtime_ns <= self._marks[key]:
+                return False
+            self._marks[key] = int(mtime_ns)
+            text = json.dumps(self._marks, indent=1, sort_keys=True)
+            try:
+                publish(
+                    self.path,
+                    lambda temporary: temporary.write_text(text, encoding="utf-8"),
+                )
+            except OSError as error:
+                logging.error("Unable to save %s: %s", self.path, error)
+        return True
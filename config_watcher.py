@@ -0,0 +1,60 @@
+"""Module to reload the settings when their ini file changes on disk"""
+import logging
+import os
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from debounce_scheduler import DebounceScheduler
+from renamer_settings_model import RenamerSettings
+
+
+class ConfigWatcher(FileSystemEventHandler):
+    """Watches the directory of the ini file and reloads changed settings"""
+
+    # Editors and deploy scripts often write a file in several steps
+    DELAY_RELOAD = 0.2
+
+    def __init__(self, model: RenamerSettings, on_change=None):
+        super().__init__()
+        self.model = model
+        self.on_change = on_change
+        self._path = os.path.normcase(os.path.abspath(model.config_file))
+        self._observer = None
+        self._scheduler = DebounceScheduler(name="sbRenamer-config")
+
+    def start(self):
+        """Start watching the ini file"""
+        self._observer = Observer()
+        self._observer.schedule(self, os.path.dirname(self._path), recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+        logging.info("Watching %s for changes", self.model.config_file)
+
+    def stop(self):
+        """Stop watching the ini file"""
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._scheduler.stop()
+
+    def is_config_file(self, path) -> bool:
+        """Returns True if path points to the watched ini file"""
+        return bool(path) and os.path.normcase(os.path.abspath(path)) == self._path
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+            return
+        paths = (
+            os.fsdecode(event.src_path),
+            os.fsdecode(getattr(event, "dest_path", "")),
+        )
+        if any(self.is_config_file(path) for path in paths):
+            self._scheduler.schedule(self._path, self.DELAY_RELOAD, self.reload)
+
+    def reload(self):
+        """Reload the settings and report the changed keys"""
+        changed = self.model.reload()
+        if changed and self.on_change:
+            self.on_change(changed)
@@ -0,0 +1,69 @@
+"""Module to find out if two files have the same content
+
+Sizes are compared first, only files of equal size are hashed. Hashes are
+cached on file identity, so a target that didn't change is not read again
+and a file that is renamed keeps its hash
+"""
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = 64
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """blake2b digest of the content of path, streamed from a memory map"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # An empty file can't be mapped
+            return digest.digest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, len(mapped), CHUNK_SIZE):
+                digest.update(mapped[start : start + CHUNK_SIZE])
+    return digest.digest()
+
+
+class HashCache:
+    """Digests of recently hashed files, keyed on device, inode, size and mtime"""
+
+    def __init__(self, size=CACHE_SIZE, digest=file_digest):
+        self._size = size
+        self._digest = digest
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def identity(stat):
+        """Cache key of a file from its stat result"""
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def digest(self, path, stat=None):
+        """Cached digest of path, hashed when the file is new or changed"""
+        identity = self.identity(stat or os.stat(path))
+        with self._lock:
+            if identity in self._digests:
+                self._digests.move_to_end(identity)
+                return self._digests[identity]
+        digest = self._digest(path)
+        with self._lock:
+            self._digests[identity] = digest
+            if len(self._digests) > self._size:
+                self._digests.popitem(last=False)
+        return digest
+
+    def same_content(self, first, second) -> bool:
+        """True when both files exist and have the same size and digest"""
+        try:
+            first_stat = os.stat(first)
+            second_stat = os.stat(second)
+            if first_stat.st_size != second_stat.st_size:
+                return False
+            if self.identity(first_stat) == self.identity(second_stat):
+                return True
+            return self.digest(first, first_stat) == self.digest(second, second_stat)
+        except OSError:
+            return False
@@ -0,0 +1,137 @@
+"""Module with the ways a target file can be copied
+
+reflink        clone the blocks on copy-on-write file systems (btrfs, xfs)
+copy_file_range let the kernel copy, no data passes through the process
+hardlink       no copy at all, only safe when the target is never written to
+copy           plain shutil.copyfile, works everywhere
+
+With auto the fastest of reflink, copy_file_range and copy that works is
+detected once per pair of file systems. hardlink is never picked automatically
+"""
+import errno
+import logging
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+COPY_AUTO = "auto"
+COPY_REFLINK = "reflink"
+COPY_RANGE = "copy_file_range"
+COPY_HARDLINK = "hardlink"
+COPY_PLAIN = "copy"
+COPY_MODES = [COPY_AUTO, COPY_REFLINK, COPY_RANGE, COPY_HARDLINK, COPY_PLAIN]
+AUTO_ORDER = (COPY_REFLINK, COPY_RANGE, COPY_PLAIN)
+# linux/fs.h _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# Errors that mean the file system or platform can't do it, not that the copy failed
+UNSUPPORTED = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+    errno.EPERM,
+    errno.EMLINK,
+}
+
+
+class CopyNotSupported(OSError):
+    """Raised when a copy mode is not available for the source and target"""
+
+
+def _unsupported(error):
+    return isinstance(error, CopyNotSupported) or error.errno in UNSUPPORTED
+
+
+def reflink(source, target):
+    """Clone source into target with the FICLONE ioctl"""
+    if fcntl is None:
+        raise CopyNotSupported(errno.ENOSYS, "reflink needs linux")
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def copy_range(source, target):
+    """Copy in the kernel with copy_file_range"""
+    if not hasattr(os, "copy_file_range"):
+        # sendfile is no substitute, outside linux it only writes to sockets
+        raise CopyNotSupported(errno.ENOSYS, "no copy_file_range")
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+            if copied == 0:
+                # Some file systems copy nothing, a short target is no copy
+                raise CopyNotSupported(
+                    errno.EIO, f"copy_file_range stopped with {remaining} bytes left"
+                )
+            remaining -= copied
+
+
+def hardlink(source, target):
+    """Make target another name of source"""
+    if os.path.lexists(target):
+        os.remove(target)
+    os.link(source, target)
+
+
+def plain_copy(source, target):
+    """Copy the bytes through the process"""
+    shutil.copyfile(source, target)
+
+
+COPY_FUNCTIONS = {
+    COPY_REFLINK: reflink,
+    COPY_RANGE: copy_range,
+    COPY_HARDLINK: hardlink,
+    COPY_PLAIN: plain_copy,
+}
+
+
+class FileCopier:
+    """Copies with the configured mode, remembers what works per file system"""
+
+    def __init__(self):
+        # (mode, source device, target device) -> mode that works
+        self._working = {}
+        self._lock = threading.Lock()
+
+    def copy(self, source, target, mode=COPY_AUTO):
+        """Copy source to target, returns the mode that was used"""
+        key = (mode, os.stat(source).st_dev, os.stat(os.path.dirname(target)).st_dev)
+        with self._lock:
+            known = self._working.get(key)
+        if known:
+            COPY_FUNCTIONS[known](source, target)
+            return known
+
+        if mode == COPY_AUTO:
+            candidates = AUTO_ORDER
+        elif mode in COPY_FUNCTIONS:
+            candidates = (mode, COPY_PLAIN) if mode != COPY_PLAIN else (mode,)
+        else:
+            logging.warning("Unknown copy mode %s, using %s", mode, COPY_PLAIN)
+            candidates = (COPY_PLAIN,)
+
+        for candidate in candidates:
+            try:
+                COPY_FUNCTIONS[candidate](source, target)
+            except OSError as error:
+                if candidate == COPY_PLAIN or not _unsupported(error):
+                    raise
+                logging.debug("%s not supported for %s: %s", candidate, target, error)
+                continue
+            if candidate != mode and mode != COPY_AUTO:
+                logging.warning("Copy mode %s not supported, using %s", mode, candidate)
+            else:
+                logging.debug("Using copy mode %s for %s", candidate, target)
+            with self._lock:
+                self._working[key] = candidate
+            return candidate
+        raise CopyNotSupported(errno.ENOSYS, f"No copy mode works for {target}")
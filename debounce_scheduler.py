@@ -0,0 +1,144 @@
+"""Module with a scheduler that keeps one pending job per key"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class _Job:
+    """Pending job, bookkeeping for DebounceScheduler only"""
+
+    __slots__ = ("key", "deadline", "seq", "method", "args", "merged")
+
+    def __init__(self, key, deadline, seq, method, args):
+        self.key = key
+        self.deadline = deadline
+        self.seq = seq
+        self.method = method
+        self.args = args
+        self.merged = 0
+
+
+class DebounceScheduler:
+    """
+    Runs delayed jobs from one thread, with at most one pending job per key
+    Scheduling a key that is still pending pushes back its deadline
+    and counts the event as merged instead of adding a new job
+    """
+
+    def __init__(self, name="sbRenamer-scheduler", clock=time.monotonic):
+        self._name = name
+        self._clock = clock
+        self._jobs = {}
+        # (deadline, seq, key), entries with an outdated seq are skipped
+        self._heap = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def schedule(self, key, delay, method_to_execute, *args) -> bool:
+        """
+        Schedule method_to_execute(*args) to run delay seconds from now
+        Returns True when the job was merged into a pending job for key
+        """
+        with self._condition:
+            if self._stopping:
+                logging.warning("Scheduler stopped, not scheduling %s", key)
+                return False
+            job = self._jobs.get(key)
+            merged = job is not None
+            if merged:
+                job.method = method_to_execute
+                job.args = args
+                job.merged += 1
+                self._postpone(job, delay)
+            else:
+                job = _Job(
+                    key, self._clock() + delay, next(self._seq), method_to_execute, args
+                )
+                self._jobs[key] = job
+                heapq.heappush(self._heap, (job.deadline, job.seq, key))
+            self._ensure_thread()
+            self._condition.notify()
+        return merged
+
+    def touch(self, key, delay) -> bool:
+        """Push back the deadline of a pending job, returns False if there is none"""
+        with self._condition:
+            job = self._jobs.get(key)
+            if job is None:
+                return False
+            job.merged += 1
+            self._postpone(job, delay)
+            self._condition.notify()
+        logging.debug("Postponed job for %s, %d events merged", key, job.merged)
+        return True
+
+    def is_pending(self, key) -> bool:
+        """Returns True if a job for key is waiting to be executed"""
+        with self._condition:
+            return key in self._jobs
+
+    def pending(self) -> int:
+        """Number of jobs waiting to be executed"""
+        with self._condition:
+            return len(self._jobs)
+
+    def stop(self):
+        """Accept no new jobs, the thread ends after the pending jobs ran"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+
+    def join(self, timeout=None):
+        """Wait for the scheduler thread to end"""
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _postpone(self, job, delay):
+        """Give job a new deadline, lock must be held"""
+        job.deadline = self._clock() + delay
+        job.seq = next(self._seq)
+        heapq.heappush(self._heap, (job.deadline, job.seq, job.key))
+
+    def _ensure_thread(self):
+        """Start the worker thread on first use, lock must be held"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self._name)
+            self._thread.start()
+
+    def _next_due_job(self):
+        """Wait for the next due job, returns None when stopped and drained"""
+        with self._condition:
+            while True:
+                if not self._heap:
+                    if self._stopping:
+                        return None
+                    self._condition.wait()
+                    continue
+                deadline, seq, key = self._heap[0]
+                job = self._jobs.get(key)
+                if job is None or job.seq != seq:
+                    heapq.heappop(self._heap)
+                    continue
+                now = self._clock()
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+                heapq.heappop(self._heap)
+                del self._jobs[key]
+                return job
+
+    def _run(self):
+        while True:
+            job = self._next_due_job()
+            if job is None:
+                return
+            if job.merged:
+                logging.info("Processing %s, merged %d events", job.key, job.merged)
+            try:
+                job.method(*job.args)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Job for %s failed", job.key)
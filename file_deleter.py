@@ -0,0 +1,364 @@
+"""Module that removes old files from the download folder
+
+The first sweep scans the whole folder and fills an index of modification
+times, later sweeps only look at the files the index says have expired
+The index is kept up to date from file system events and refreshed with
+a full scan once a day for changes that were missed
+"""
+import fnmatch
+import heapq
+import logging
+import os
+import threading
+import time
+
+from metrics import NULL_METRICS
+from worker_pool import WorkerPool
+
+SECONDS_PER_DAY = 24 * 60 * 60
+RESCAN_INTERVAL = SECONDS_PER_DAY
+SIZE_UNITS = {"KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
+
+
+def parse_size(text):
+    """Bytes in '2GB', '500 MB' or '1024', 0 when empty"""
+    text = (text or "").strip().upper()
+    if not text:
+        return 0
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[: -len(unit)]) * factor)
+    return int(text.rstrip("B"))
+
+
+def parse_file_limits(text):
+    """Maximum number of files per pattern from '*.xml=200; b738x_*.xml=50'"""
+    limits = {}
+    for part in (text or "").split(";"):
+        if not part.strip():
+            continue
+        pattern, separator, count = part.rpartition("=")
+        if not separator or not pattern.strip():
+            raise ValueError(f"Expected pattern=count, got {part.strip()}")
+        limits[pattern.strip()] = int(count)
+    return limits
+
+
+class MtimeIndex:
+    """
+    Modification times and sizes of files with a min heap on mtime
+    Changed and removed files leave stale heap entries behind, they are
+    skipped when popped and dropped when the heap gets too big
+    The total size is kept up to date, so limits need no directory walk
+    """
+
+    def __init__(self):
+        # path -> (mtime, size)
+        self._entries = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    def clear(self):
+        """Forget all files"""
+        with self._lock:
+            self._entries.clear()
+            self._heap.clear()
+            self.total_bytes = 0
+
+    def update(self, path, mtime, size=0):
+        """Add path or record its new modification time and size"""
+        mtime = int(mtime)
+        with self._lock:
+            old_mtime, old_size = self._entries.get(path, (None, 0))
+            self._entries[path] = (mtime, size)
+            self.total_bytes += size - old_size
+            if old_mtime == mtime:
+                return
+            heapq.heappush(self._heap, (mtime, path))
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._compact()
+
+    def remove(self, path):
+        """Forget path, its heap entry is skipped later"""
+        with self._lock:
+            self._drop(path)
+
+    def pop_expired(self, cutoff):
+        """Remove and return the files modified at or before cutoff"""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= cutoff:
+                path = self._pop()
+                if path is not None:
+                    expired.append(path)
+        return expired
+
+    def pop_oldest(self):
+        """Remove and return the least recently modified file, None when empty"""
+        with self._lock:
+            while self._heap:
+                path = self._pop()
+                if path is not None:
+                    return path
+        return None
+
+    def _pop(self):
+        mtime, path = heapq.heappop(self._heap)
+        if self._entries.get(path, (None,))[0] != mtime:
+            return None
+        self._drop(path)
+        return path
+
+    def _drop(self, path):
+        _, size = self._entries.pop(path, (None, 0))
+        self.total_bytes -= size
+
+    def _compact(self):
+        self._heap = [(mtime, path) for path, (mtime, _) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+
+class FileDeleter:
+    """Object to check and delete files"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self, folder, days, batch_size=0, max_bytes=0, max_files=None, metrics=None
+    ):
+        # folder is the name of the folder in which we have to perform the delete operation
+        self.folder = folder
+
+        # N is the number of days for which we have to check whether the file is older
+        # than the specified days or not
+        self.days = int(days)
+        # Unlinks are done in batches on a worker thread when batch_size is set
+        self.batch_size = int(batch_size)
+        self._deleted = 0
+        self._deleted_lock = threading.Lock()
+        # Oldest files are removed first to keep the folder below these limits
+        self.max_bytes = int(max_bytes)
+        self.max_files = dict(max_files or {})
+        # Index keys are normalised paths, events and scans use the same form
+        self._folder = os.path.normpath(os.fspath(folder))
+        self.index = MtimeIndex()
+        # pattern -> index of the files matching it
+        self._counted = {pattern: MtimeIndex() for pattern in self.max_files}
+        # monotonic time of the last full scan, None before the first one
+        self._scanned_at = None
+        self.metrics = metrics or NULL_METRICS
+        logging.debug(
+            "Initialised new deleter for path %s and %d number of days",
+            self.folder,
+            self.days,
+        )
+
+    def cutoff(self, now):
+        """Files modified at or before the returned second are too old"""
+        # A file is too old when it is more than self.days whole days old
+        return int(now) - (self.days + 1) * SECONDS_PER_DAY
+
+    def list_files(self):
+        """Remove files in self.folder that are too old, returns sweep statistics"""
+
+        if self.days == 0 and not self.has_limits:
+            logging.info("Configured for no deletions")
+            return None
+
+        started = time.monotonic()
+        # One clock read for the whole sweep
+        cutoff = self.cutoff(time.time()) if self.days else None
+        self._deleted = 0
+        self.index.clear()
+        for counted in self._counted.values():
+            counted.clear()
+        scanned = 0
+        batch = []
+        pool = WorkerPool(1, 4, name="sbRenamer-delete") if self.batch_size else None
+
+        with os.scandir(self._folder) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                    scanned += 1
+                    stat = entry.stat()
+                except OSError:
+                    # Gone between listing and stat
+                    continue
+                if cutoff is None or int(stat.st_mtime) > cutoff:
+                    self._track(entry.path, stat.st_mtime, stat.st_size)
+                    continue
+                if pool is None:
+                    self.delete_files([entry.path])
+                    continue
+                batch.append(entry.path)
+                if len(batch) >= self.batch_size:
+                    pool.submit(self.delete_files, batch)
+                    batch = []
+
+        if pool is not None:
+            if batch:
+                pool.submit(self.delete_files, batch)
+            pool.shutdown(wait=True)
+        self._scanned_at = started
+        evicted = self.enforce_limits()
+
+        stats = {
+            "scanned": scanned,
+            "deleted": self._deleted,
+            "evicted": evicted,
+            "seconds": time.monotonic() - started,
+        }
+        self.metrics.observe("stage_seconds", stats["seconds"], stage="retention_scan")
+        logging.info(
+            "Scanned %d files in %s, deleted %d (%d over limits) in %d ms",
+            stats["scanned"],
+            self.folder,
+            stats["deleted"],
+            stats["evicted"],
+            stats["seconds"] * 1000,
+        )
+        return stats
+
+    def sweep(self):
+        """
+        Delete the files the index has as expired, O(expired) instead of a scan
+        Falls back to a full scan the first time and once a day
+        """
+        if self.days == 0 and not self.has_limits:
+            return None
+        started = time.monotonic()
+        if self._scanned_at is None or started - self._scanned_at > RESCAN_INTERVAL:
+            return self.list_files()
+
+        self._deleted = 0
+        expired = []
+        candidates = []
+        cutoff = None
+        if self.days:
+            cutoff = self.cutoff(time.time())
+            candidates = self.index.pop_expired(cutoff)
+        for path in candidates:
+            self._forget(path)
+            # Changes can be missed when nobody watches, check before deleting
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if int(stat.st_mtime) > cutoff:
+                self._track(path, stat.st_mtime, stat.st_size)
+            else:
+                expired.append(path)
+        self.delete_files(expired)
+        evicted = self.enforce_limits()
+
+        stats = {
+            "scanned": len(candidates),
+            "deleted": self._deleted,
+            "evicted": evicted,
+            "seconds": time.monotonic() - started,
+        }
+        self.metrics.observe("stage_seconds", stats["seconds"], stage="retention_sweep")
+        if candidates or evicted:
+            logging.info(
+                "Checked %d expired files in %s, deleted %d (%d over limits) in %d ms",
+                stats["scanned"],
+                self.folder,
+                stats["deleted"],
+                stats["evicted"],
+                stats["seconds"] * 1000,
+            )
+        return stats
+
+    @property
+    def has_limits(self) -> bool:
+        """True when a size or count limit is set"""
+        return bool(self.max_bytes or self.max_files)
+
+    def over_limits(self) -> bool:
+        """True when the folder holds more bytes or files than allowed"""
+        if self.max_bytes and self.index.total_bytes > self.max_bytes:
+            return True
+        return any(
+            len(self._counted[pattern]) > limit
+            for pattern, limit in self.max_files.items()
+        )
+
+    def enforce_limits(self):
+        """Delete the oldest files until all limits are met, returns how many"""
+        evicted = []
+        for pattern, limit in self.max_files.items():
+            counted = self._counted[pattern]
+            while len(counted) > limit:
+                path = counted.pop_oldest()
+                if path is None:
+                    break
+                self._forget(path)
+                evicted.append(path)
+        while self.max_bytes and self.index.total_bytes > self.max_bytes:
+            path = self.index.pop_oldest()
+            if path is None:
+                break
+            self._forget(path)
+            evicted.append(path)
+        if evicted:
+            logging.debug("Evicting %d files over the limits", len(evicted))
+            self.delete_files(evicted)
+        return len(evicted)
+
+    def _track(self, path, mtime, size):
+        self.index.update(path, mtime, size)
+        name = os.path.basename(path)
+        for pattern, counted in self._counted.items():
+            if fnmatch.fnmatch(name, pattern):
+                counted.update(path, mtime, size)
+
+    def _forget(self, path):
+        self.index.remove(path)
+        for counted in self._counted.values():
+            counted.remove(path)
+
+    def file_changed(self, path):
+        """Record a created or modified file, called for file system events"""
+        path = os.path.normpath(path)
+        if os.path.dirname(path) != self._folder:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._forget(path)
+            return
+        self._track(path, stat.st_mtime, stat.st_size)
+
+    def file_removed(self, path):
+        """Forget a deleted or moved file"""
+        self._forget(os.path.normpath(path))
+
+    def delete_files(self, paths):
+        """Unlink paths, files that are already gone are skipped"""
+        deleted = 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except OSError as error:
+                logging.error("Unable to delete %s: %s", path, error)
+                self.metrics.inc("errors", stage="delete")
+                continue
+            deleted += 1
+            logging.debug("Deleting : %s", path)
+        with self._deleted_lock:
+            self._deleted += deleted
+        self.metrics.inc("files_deleted", deleted)
+
+    def file_is_to_old(self, filename):
+        """Function returns true if file is to old, modified longer than self.days ago"""
+        return int(os.path.getmtime(filename)) <= self.cutoff(time.time())
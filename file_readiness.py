@@ -0,0 +1,83 @@
+"""Module to detect that a writer has finished with a file"""
+import logging
+import os
+import time
+
+FIRST_INTERVAL = 0.01
+MAX_INTERVAL = 0.5
+
+
+def file_signature(path):
+    """Returns size and modification time, changes while a file is written"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def can_open_exclusive(path) -> bool:
+    """
+    On windows a writer normally denies shared write access,
+    so opening for update fails until the writer has closed the file
+    Other platforms don't lock, there the signature has to do
+    """
+    if os.name != "nt":
+        return True
+    try:
+        with open(path, "rb+"):
+            return True
+    except PermissionError:
+        return False
+
+
+def wait_until_stable(
+    path,
+    timeout,
+    first_interval=FIRST_INTERVAL,
+    max_interval=MAX_INTERVAL,
+    clock=time.monotonic,
+    sleep=time.sleep,
+) -> bool:
+    """
+    Poll size and mtime until they stop changing between two polls
+    The interval doubles after every poll up to max_interval,
+    returns False when the file is still changing after timeout seconds
+    Raises FileNotFoundError when the file is gone
+    """
+    deadline = clock() + timeout
+    interval = first_interval
+    previous = file_signature(path)
+    while True:
+        sleep(min(interval, max(deadline - clock(), 0)))
+        current = file_signature(path)
+        if current == previous and current[0] > 0 and can_open_exclusive(path):
+            return True
+        if clock() >= deadline:
+            logging.debug("%s not stable after %s seconds", path, timeout)
+            return False
+        previous = current
+        interval = min(interval * 2, max_interval)
+
+
+async def wait_until_stable_async(
+    path, timeout, first_interval=FIRST_INTERVAL, max_interval=MAX_INTERVAL
+) -> bool:
+    """
+    Same poll as wait_until_stable for an asyncio loop
+    The stat calls run on the default executor of the running loop
+    """
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    interval = first_interval
+    previous = await loop.run_in_executor(None, file_signature, path)
+    while True:
+        await asyncio.sleep(min(interval, max(deadline - loop.time(), 0)))
+        current = await loop.run_in_executor(None, file_signature, path)
+        if current == previous and current[0] > 0:
+            if await loop.run_in_executor(None, can_open_exclusive, path):
+                return True
+        if loop.time() >= deadline:
+            logging.debug("%s not stable after %s seconds", path, timeout)
+            return False
+        previous = current
+        interval = min(interval * 2, max_interval)
@@ -0,0 +1,206 @@
+"""Module with the rules that turn a downloaded file name into target file names
+
+A rule is a pattern on the file name and one or more templates, for example
+
+    *.xml => b738x.xml
+    re:^(?P<orig>[A-Z]{4})(?P<dest>[A-Z]{4}) => {orig}{dest}.xml; {stem[:8]}01.xml
+
+Templates can use {name}, {stem} and {suffix} of the downloaded file, slices
+like {stem[:8]} and the named groups of a regex pattern. {orig} and {dest} are
+read from the file when a header reader is given, otherwise they are taken
+from the first eight letters of the stem. Named groups always win
+Rules are compiled once, applying them is a dictionary lookup and a few joins
+"""
+import fnmatch
+import logging
+import pathlib
+import re
+
+REGEX_PREFIX = "re:"
+RULE_SEPARATOR = "=>"
+TEMPLATE_SEPARATOR = ";"
+# Fields that can be read from the content of the file
+HEADER_FIELDS = frozenset(("orig", "dest"))
+ICAO_PAIR = re.compile(r"(?P<orig>[A-Za-z]{4})(?P<dest>[A-Za-z]{4})")
+_FIELD = re.compile(r"\{(\w+)(?:\[(-?\d*):(-?\d*)\])?\}")
+
+
+class RuleError(ValueError):
+    """Raised when a rule can't be compiled"""
+
+
+class Template:
+    """Target file name template, parsed once into literal text and fields"""
+
+    __slots__ = ("text", "_parts", "fields")
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self._parts = []
+        self.fields = set()
+        position = 0
+        for match in _FIELD.finditer(self.text):
+            if match.start() > position:
+                self._parts.append(self.text[position : match.start()])
+            name, start, stop = match.groups()
+            if start is None:
+                field_slice = None
+            else:
+                field_slice = slice(
+                    int(start) if start else None, int(stop) if stop else None
+                )
+            self._parts.append((name, field_slice))
+            self.fields.add(name)
+            position = match.end()
+        if position < len(self.text):
+            self._parts.append(self.text[position:])
+        literal = _FIELD.sub("", self.text)
+        if "{" in literal or "}" in literal or "/" in literal or "\\" in literal:
+            raise RuleError(f"Invalid template {self.text}")
+
+    def render(self, values):
+        """
+        Returns the file name, raises KeyError when a field has no value
+        and RuleError when the values don't make a plain file name
+        """
+        rendered = []
+        for part in self._parts:
+            if isinstance(part, str):
+                rendered.append(part)
+            else:
+                name, field_slice = part
+                value = values[name]
+                rendered.append(value[field_slice] if field_slice else value)
+        file_name = "".join(rendered)
+        # Values come from the file name or its content, they must not leave the folder
+        if (
+            file_name in ("", ".", "..")
+            or "\0" in file_name
+            or pathlib.PurePosixPath(file_name).name != file_name
+            or pathlib.PureWindowsPath(file_name).name != file_name
+        ):
+            raise RuleError(f"{self.text} makes {file_name!r}, not a file name")
+        return file_name
+
+
+class FilenameRule:
+    """Pattern on the downloaded file name with the templates for its targets"""
+
+    __slots__ = ("name", "pattern", "suffix", "_match", "templates", "needs_header")
+
+    def __init__(self, name, pattern, templates):
+        self.name = name
+        self.pattern = pattern.strip()
+        if self.pattern.startswith(REGEX_PREFIX):
+            # A regex can match any suffix
+            self.suffix = None
+            try:
+                regex = re.compile(self.pattern[len(REGEX_PREFIX) :])
+            except re.error as error:
+                raise RuleError(f"Invalid regex in rule {name}: {error}") from error
+            self._match = regex.search
+            groups = set(regex.groupindex)
+        else:
+            suffix = pathlib.PurePath(self.pattern).suffix
+            self.suffix = suffix.lower() if suffix and "*" not in suffix else None
+            self._match = re.compile(
+                fnmatch.translate(self.pattern), re.IGNORECASE
+            ).match
+            groups = set()
+        self.templates = tuple(Template(template) for template in templates)
+        if not self.templates:
+            raise RuleError(f"Rule {name} has no target")
+        fields = set().union(*(template.fields for template in self.templates))
+        self.needs_header = bool((fields & HEADER_FIELDS) - groups)
+
+    @classmethod
+    def parse(cls, name, definition):
+        """Create rule from 'pattern => template; template'"""
+        pattern, separator, templates = definition.partition(RULE_SEPARATOR)
+        if not separator:
+            raise RuleError(
+                f"Rule {name} needs '{RULE_SEPARATOR}' between pattern and target"
+            )
+        return cls(
+            name,
+            pattern,
+            [text for text in templates.split(TEMPLATE_SEPARATOR) if text.strip()],
+        )
+
+    def applies_to(self, file_name):
+        """True when the pattern matches file_name"""
+        return self._match(file_name) is not None
+
+    def match(self, file_name, read_header=None):
+        """
+        Returns the values for the templates, None if the rule does not apply
+        read_header is only called when a template needs a field from the file
+        """
+        match = self._match(file_name)
+        if not match:
+            return None
+        path = pathlib.PurePath(file_name)
+        values = {"name": file_name, "stem": path.stem, "suffix": path.suffix}
+        icao = ICAO_PAIR.match(path.stem)
+        if icao:
+            values.update(icao.groupdict())
+        if self.needs_header and read_header:
+            values.update(read_header())
+        values.update(
+            {
+                key: value
+                for key, value in match.groupdict().items()
+                if value is not None
+            }
+        )
+        return values
+
+    def targets(self, file_name, values):
+        """Render all templates, names that can't be rendered are skipped"""
+        names = []
+        for template in self.templates:
+            try:
+                names.append(pathlib.Path(template.render(values)))
+            except KeyError as error:
+                logging.warning(
+                    "Rule %s has no value for %s in %s", self.name, error, file_name
+                )
+            except RuleError as error:
+                logging.warning("Rule %s for %s: %s", self.name, file_name, error)
+        return tuple(names)
+
+
+class FilenameRules:
+    """Ordered rules with a lookup on suffix, the first matching rule wins"""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        any_suffix = [rule for rule in self.rules if rule.suffix is None]
+        self._by_suffix = {}
+        for rule in self.rules:
+            if rule.suffix is not None and rule.suffix not in self._by_suffix:
+                self._by_suffix[rule.suffix] = tuple(
+                    candidate
+                    for candidate in self.rules
+                    if candidate.suffix in (rule.suffix, None)
+                )
+        self._any_suffix = tuple(any_suffix)
+
+    def candidates(self, suffix):
+        """Rules that can match a file with suffix, in order"""
+        return self._by_suffix.get(suffix.lower(), self._any_suffix)
+
+    def find(self, file_name):
+        """First rule that applies to file_name, None when there is none"""
+        for rule in self.candidates(pathlib.PurePath(file_name).suffix):
+            if rule.applies_to(file_name):
+                return rule
+        return None
+
+    def targets(self, file_name, read_header=None):
+        """Target names for file_name, empty when no rule applies"""
+        for rule in self.candidates(pathlib.PurePath(file_name).suffix):
+            values = rule.match(file_name, read_header)
+            if values is not None:
+                return rule.targets(file_name, values)
+        return ()
@@ -0,0 +1,241 @@
+"""Module with counters, histograms and gauges in the Prometheus text format
+
+Metrics are kept in memory, written to a text file every few seconds and
+optionally served on localhost for headless installs
+When metrics are off the handlers get NULL_METRICS, whose methods do nothing
+"""
+import bisect
+import logging
+import pathlib
+import threading
+
+from atomic_publish import publish
+
+PREFIX = "sbrenamer_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTERS = {
+    "events_received": "Modified or closed events for watched files",
+    "events_ignored": "Events for processed files or files without a rule",
+    "files_copied": "Targets written by a copy",
+    "files_renamed": "Targets written by a rename",
+    "backups": "Existing targets kept under a new name",
+    "files_deleted": "Files removed by the clean up",
+    "errors": "Failed copies, renames, backups and deletes",
+    "notifications": "Messages shown in the system tray",
+}
+HISTOGRAMS = {
+    "processing_seconds": "Seconds from the first event to the written target",
+    "stage_seconds": "Seconds spent in one stage of a job or clean up",
+}
+GAUGES = {
+    "threads": "Live threads",
+    "pending_jobs": "Jobs waiting for their delay or a worker",
+    "monitoring": "1 when the folders are watched",
+}
+
+
+def _labels(labels, extra=""):
+    text = ",".join(f'{name}="{value}"' for name, value in labels)
+    if extra:
+        text = f"{text},{extra}" if text else extra
+    return "{" + text + "}" if text else ""
+
+
+class Metrics:
+    """Thread safe counters, histograms and gauges, labels as keyword arguments"""
+
+    enabled = True
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (name, labels) -> value
+        self._counters = {}
+        # (name, labels) -> [count per bucket ..., count, sum]
+        self._histograms = {}
+        # name -> function returning the current value
+        self._gauges = {}
+
+    def inc(self, name, amount=1, **labels):
+        """Add amount to counter name"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        """Add a duration to histogram name"""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self._buckets, seconds)
+        with self._lock:
+            values = self._histograms.setdefault(key, [0] * (len(self._buckets) + 2))
+            if index < len(self._buckets):
+                values[index] += 1
+            values[-2] += 1
+            values[-1] += seconds
+
+    def gauge(self, name, function):
+        """Report function() as gauge name"""
+        with self._lock:
+            self._gauges[name] = function
+
+    def value(self, name, **labels):
+        """Current value of a counter, for tests and logging"""
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            gauges = dict(self._gauges)
+        lines = []
+        for name, help_text in COUNTERS.items():
+            metric = f"{PREFIX}{name}_total"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            samples = {
+                labels: value
+                for (key, labels), value in counters.items()
+                if key == name
+            }
+            for labels, value in sorted(samples.items()) or [((), 0)]:
+                lines.append(f"{metric}{_labels(labels)} {value}")
+        for name, help_text in HISTOGRAMS.items():
+            metric = f"{PREFIX}{name}"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for (key, labels), values in sorted(histograms.items()):
+                if key != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self._buckets, values):
+                    cumulative += count
+                    le = _labels(labels, f'le="{bound}"')
+                    lines.append(f"{metric}_bucket{le} {cumulative}")
+                le = _labels(labels, 'le="+Inf"')
+                lines.append(f"{metric}_bucket{le} {values[-2]}")
+                lines.append(f"{metric}_count{_labels(labels)} {values[-2]}")
+                lines.append(f"{metric}_sum{_labels(labels)} {values[-1]}")
+        for name, function in gauges.items():
+            metric = f"{PREFIX}{name}"
+            try:
+                value = function()
+            except Exception:  # pylint: disable=broad-except
+                logging.debug("Gauge %s failed", name, exc_info=True)
+                continue
+            lines += [
+                f"# HELP {metric} {GAUGES.get(name, name)}",
+                f"# TYPE {metric} gauge",
+                f"{metric} {value}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class NullMetrics:
+    """Metrics that are switched off, every call returns right away"""
+
+    enabled = False
+
+    def inc(self, name, amount=1, **labels):
+        """Does nothing"""
+
+    def observe(self, name, seconds, **labels):
+        """Does nothing"""
+
+    def gauge(self, name, function):
+        """Does nothing"""
+
+    def value(self, name, **labels):
+        """Always 0"""
+        return 0
+
+    def render(self) -> str:
+        """Nothing to export"""
+        return ""
+
+
+NULL_METRICS = NullMetrics()
+
+
+class MetricsExporter:
+    """Writes the metrics to a file every interval seconds, serves them when port is set"""
+
+    def __init__(self, metrics, path, interval=15, port=0):
+        self.metrics = metrics
+        self.path = pathlib.Path(path)
+        self.interval = interval
+        self.port = int(port)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self):
+        """Start writing, and serving when a port is set"""
+        self._thread = threading.Thread(
+            target=self._run, name="sbRenamer-metrics", daemon=True
+        )
+        self._thread.start()
+        if self.port:
+            self._start_server()
+
+    def _start_server(self):
+        # Only installs that serve the metrics pay for importing the server
+        import http.server  # pylint: disable=import-outside-toplevel
+
+        metrics = self.metrics
+
+        class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+            """Answers GET /metrics"""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Metrics on /metrics, nothing else"""
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                logging.debug("Metrics request: " + format, *args)
+
+        try:
+            self._server = http.server.ThreadingHTTPServer(
+                ("127.0.0.1", self.port), MetricsRequestHandler
+            )
+        except OSError as error:
+            logging.error("Unable to serve metrics on port %d: %s", self.port, error)
+            return
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever,
+            name="sbRenamer-metrics-http",
+            daemon=True,
+        ).start()
+        logging.info("Serving metrics on http://127.0.0.1:%d/metrics", self.port)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        """Replace the metrics file with the current values"""
+        text = self.metrics.render()
+        try:
+            publish(self.path, lambda temporary: temporary.write_text(text, "utf-8"))
+        except OSError as error:
+            logging.error("Unable to write metrics to %s: %s", self.path, error)
+
+    def stop(self):
+        """Stop serving and writing, the file gets the final values"""
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
@@ -0,0 +1,266 @@
+"""Module with a polling observer for network shares
+
+Native events are often missed on SMB and NFS mounts. This observer polls,
+but keeps the cost at idle low
+- a folder is only listed again when its own mtime changed
+- only names that match the patterns are stat'ed
+- overwriting a file in place doesn't change its folder, so recently changed
+  files are stat'ed on every poll and the others a slice at a time, besides
+  a full rescan every few minutes
+- the poll interval doubles while nothing changes and drops back to the
+  minimum on activity
+"""
+import collections
+import fnmatch
+import functools
+import os
+import time
+
+from watchdog.events import (
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileMovedEvent,
+)
+from watchdog.observers.api import (
+    DEFAULT_EMITTER_TIMEOUT,
+    DEFAULT_OBSERVER_TIMEOUT,
+    BaseObserver,
+    EventEmitter,
+)
+
+PATTERNS = ("*.xml", "*.fms")
+MIN_INTERVAL = 0.25
+MAX_INTERVAL = 5.0
+RESCAN_INTERVAL = 300.0
+# Files changed less than this many seconds ago are stat'ed on every poll
+HOT_SECONDS = 30.0
+# Number of other files stat'ed per poll, in turn
+COLD_SLICE = 50
+
+
+class AdaptivePollingEmitter(EventEmitter):
+    """Polls one watched folder, recursive when the watch is"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        event_queue,
+        watch,
+        *,
+        timeout=DEFAULT_EMITTER_TIMEOUT,
+        event_filter=None,
+        patterns=PATTERNS,
+        min_interval=MIN_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        clock=time.monotonic,
+    ):
+        super().__init__(event_queue, watch, timeout=timeout, event_filter=event_filter)
+        # Patterns are matched on the name only, case insensitive
+        self._patterns = tuple(
+            pattern.replace("\\", "/").rsplit("/", 1)[-1].lower()
+            for pattern in patterns
+        )
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._clock = clock
+        self.interval = min_interval
+        # path -> (size, mtime_ns, inode)
+        self._files = {}
+        # folder -> paths in _files
+        self._by_folder = collections.defaultdict(set)
+        # folder -> mtime_ns
+        self._folders = {}
+        # path -> clock time of the last change
+        self._hot = {}
+        # Paths in the order their next turn comes, removed paths are skipped
+        self._cold = collections.deque()
+        self._rescanned_at = None
+
+    def matches(self, name) -> bool:
+        """True when name matches one of the patterns"""
+        name = name.lower()
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self._patterns)
+
+    def on_thread_start(self):
+        # Files that are there already are no news
+        self.poll(emit=False)
+
+    def queue_events(self, timeout):
+        if self.stopped_event.wait(self.interval):
+            return
+        if self.poll():
+            self.interval = self._min_interval
+        else:
+            self.interval = min(self.interval * 2, self._max_interval)
+
+    def poll(self, emit=True) -> bool:
+        """Compare the folder with the last poll, returns True when anything changed"""
+        now = self._clock()
+        rescan = (
+            self._rescanned_at is None or now - self._rescanned_at >= RESCAN_INTERVAL
+        )
+        if rescan:
+            self._rescanned_at = now
+        root = os.fspath(self.watch.path)
+        folders = list(self._folders) if self._folders else [root]
+        seen_folders = {}
+        # path -> (size, mtime_ns, inode) of the paths looked at, None when gone
+        current = {}
+        listed = set()
+        while folders:
+            folder = folders.pop()
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            seen_folders[folder] = mtime
+            if not rescan and self._folders.get(folder) == mtime:
+                continue
+            listed.add(folder)
+            current.update(dict.fromkeys(self._by_folder.get(folder, ())))
+            self._list(folder, current, folders)
+        for folder in self._folders:
+            if folder not in seen_folders:
+                current.update(dict.fromkeys(self._by_folder.get(folder, ())))
+
+        # Folders that were not listed keep their files, some are checked one by one
+        for path in self._to_check(now, listed, current):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                current[path] = None
+                continue
+            current[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+        changed = self._emit(current, now) if emit else False
+        self._apply(current)
+        self._folders = seen_folders
+        return changed
+
+    def _list(self, folder, current, folders):
+        """Add the matching files in folder to current, new sub folders to folders"""
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.watch.is_recursive and entry.path not in self._folders:
+                            folders.append(entry.path)
+                        continue
+                    if not self.matches(entry.name):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    current[entry.path] = (
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                        stat.st_ino,
+                    )
+        except OSError:
+            pass
+
+    def _to_check(self, now, listed, current):
+        """Hot files and the next slice of the others, not in listed folders or current"""
+        paths = []
+        for path, changed_at in list(self._hot.items()):
+            if now - changed_at > HOT_SECONDS:
+                del self._hot[path]
+            elif path not in current and os.path.dirname(path) not in listed:
+                paths.append(path)
+        turns = min(COLD_SLICE, len(self._cold))
+        while turns:
+            turns -= 1
+            path = self._cold.popleft()
+            if path not in self._files:
+                # Removed since its last turn
+                continue
+            self._cold.append(path)
+            if (
+                path not in self._hot
+                and path not in current
+                and os.path.dirname(path) not in listed
+            ):
+                paths.append(path)
+        return paths
+
+    def _apply(self, current):
+        """Make current the known state of the paths in it"""
+        for path, stat in current.items():
+            folder = os.path.dirname(path)
+            if stat is None:
+                self._files.pop(path, None)
+                self._hot.pop(path, None)
+                self._by_folder[folder].discard(path)
+                if not self._by_folder[folder]:
+                    del self._by_folder[folder]
+                continue
+            if path not in self._files:
+                self._cold.append(path)
+            self._files[path] = stat
+            self._by_folder[folder].add(path)
+
+    def _emit(self, current, now) -> bool:
+        created = [
+            path
+            for path, stat in current.items()
+            if stat is not None and path not in self._files
+        ]
+        deleted = [
+            path
+            for path, stat in current.items()
+            if stat is None and path in self._files
+        ]
+        modified = [
+            path
+            for path, stat in current.items()
+            if stat is not None
+            and path in self._files
+            and stat[:2] != self._files[path][:2]
+        ]
+        # A file that disappeared and one with the same inode that appeared is a move
+        moved_from = {
+            self._files[path][2]: path for path in deleted if self._files[path][2]
+        }
+        moves = 0
+        for path in list(created):
+            source = moved_from.pop(current[path][2], None)
+            if source is not None:
+                deleted.remove(source)
+                created.remove(path)
+                moves += 1
+                self.queue_event(FileMovedEvent(source, path))
+                self._hot[path] = now
+        for path in deleted:
+            self.queue_event(FileDeletedEvent(path))
+        for path in created:
+            self._hot[path] = now
+            self.queue_event(FileCreatedEvent(path))
+            # Like native observers, writing a new file is a modification too
+            self.queue_event(FileModifiedEvent(path))
+        for path in modified:
+            self._hot[path] = now
+            self.queue_event(FileModifiedEvent(path))
+        return bool(created or deleted or modified or moves)
+
+
+class AdaptivePollingObserver(BaseObserver):
+    """Observer that polls, for folders where native events are unreliable"""
+
+    def __init__(
+        self,
+        patterns=PATTERNS,
+        min_interval=MIN_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        timeout=DEFAULT_OBSERVER_TIMEOUT,
+    ):
+        super().__init__(
+            functools.partial(
+                AdaptivePollingEmitter,
+                patterns=patterns,
+                min_interval=min_interval,
+                max_interval=max_interval,
+            ),
+            timeout=timeout,
+        )
@@ -0,0 +1,163 @@
+"""Module with the journal of processed files
+
+Every processed file is appended to the journal as one json line with its
+path, size, mtime_ns and inode, so a file is recognised again after a
+restart, while its name alone can be reused by the next download
+Entries older than max_days are dropped when the journal is compacted
+"""
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+
+from atomic_publish import publish
+
+
+def identity(path):
+    """(path, size, mtime_ns, inode) of the file as it is now"""
+    stat = os.stat(path)
+    return (
+        os.path.normpath(os.fspath(path)),
+        stat.st_size,
+        stat.st_mtime_ns,
+        stat.st_ino,
+    )
+
+
+class ProcessedJournal:
+    """
+    Append only journal of processed files with O(1) lookups
+    Without a path the journal is kept in memory only
+    """
+
+    def __init__(self, path=None, max_days=7, clock=time.time):
+        self.path = pathlib.Path(path) if path else None
+        self.max_days = max_days
+        self._clock = clock
+        self._lock = threading.Lock()
+        # identity -> time it was recorded
+        self._entries = {}
+        # path -> last recorded identity, for files that are gone
+        self._paths = {}
+        self._lines = 0
+        self._file = None
+        # The file ends in a line that was cut short by a crash
+        self._torn = False
+        if self.path is not None:
+            self._load()
+            self._open()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    self._lines += 1
+                    self._torn = not line.endswith("\n")
+                    try:
+                        recorded, *key = json.loads(line)
+                        self._add(tuple(key), recorded)
+                    except (TypeError, ValueError):
+                        # Torn last line after a crash
+                        logging.debug("Skipping journal line %d", self._lines)
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            logging.error("Unable to read journal %s: %s", self.path, error)
+        logging.info("Journal has %d processed files", len(self._entries))
+
+    def _open(self):
+        try:
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._torn:
+                # End the torn line, or the next record is appended to it
+                self._file.write("\n")
+                self._file.flush()
+                self._torn = False
+        except OSError as error:
+            logging.error("Unable to write journal %s: %s", self.path, error)
+            self._file = None
+
+    def _add(self, key, recorded):
+        self._entries[key] = recorded
+        self._paths[key[0]] = key
+
+    def seen(self, path) -> bool:
+        """True when path was processed as it is now, or was processed and is gone"""
+        try:
+            key = identity(path)
+        except FileNotFoundError:
+            return os.path.normpath(os.fspath(path)) in self._paths
+        except OSError:
+            return False
+        return key in self._entries
+
+    def record(self, keys):
+        """Add identities to the journal"""
+        now = self._clock()
+        with self._lock:
+            for key in keys:
+                self._add(key, now)
+                self._lines += 1
+                if self._file is None:
+                    continue
+                try:
+                    self._file.write(json.dumps([now, *key]) + "\n")
+                    self._file.flush()
+                except OSError as error:
+                    logging.error("Unable to write journal %s: %s", self.path, error)
+
+    def record_files(self, paths):
+        """Add the files in paths as they are now, missing ones are skipped"""
+        keys = []
+        for path in paths:
+            try:
+                keys.append(identity(path))
+            except OSError:
+                continue
+        self.record(keys)
+
+    def compact(self):
+        """Drop entries older than max_days, rewrite the file when it is mostly garbage"""
+        cutoff = self._clock() - self.max_days * 24 * 60 * 60
+        with self._lock:
+            expired = [
+                key for key, recorded in self._entries.items() if recorded < cutoff
+            ]
+            for key in expired:
+                del self._entries[key]
+                if self._paths.get(key[0]) == key:
+                    del self._paths[key[0]]
+            garbage = self._lines > 2 * len(self._entries) + 100
+            if self._file is None or not (expired or garbage):
+                return len(expired)
+            lines = "".join(
+                json.dumps([recorded, *key]) + "\n"
+                for key, recorded in self._entries.items()
+            )
+            self._file.close()
+            try:
+                publish(
+                    self.path,
+                    lambda temporary: temporary.write_text(lines, encoding="utf-8"),
+                )
+                self._lines = len(self._entries)
+            except OSError as error:
+                logging.error("Unable to compact journal %s: %s", self.path, error)
+            self._open()
+        logging.info("Compacted journal, dropped %d entries", len(expired))
+        return len(expired)
+
+    def close(self):
+        """Close the journal file, later records are kept in memory only"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
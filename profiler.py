@@ -0,0 +1,169 @@
+"""Module to profile a running install on demand
+
+While profiling is on, wrapped methods run under cProfile and tracemalloc
+traces allocations. Every interval the collected profile is written to a
+.prof file and the allocations that grew most since the last snapshot to a
+.txt file, only the newest files are kept
+Wrapped methods only check a flag while profiling is off
+"""
+import cProfile
+import functools
+import linecache
+import logging
+import pathlib
+import pstats
+import threading
+import time
+import tracemalloc
+
+FILE_PREFIX = "sbRenamer-"
+TOP_ALLOCATIONS = 25
+
+
+class Profiler:
+    """cProfile for wrapped methods and periodic tracemalloc snapshots"""
+
+    def __init__(self, folder, keep=10, interval=60.0, top=TOP_ALLOCATIONS):
+        self.folder = pathlib.Path(folder)
+        self.keep = int(keep)
+        self.interval = interval
+        self.top = top
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stats = None
+        self._snapshot = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def wrap(self, method):
+        """method, profiled while profiling is on"""
+
+        @functools.wraps(method)
+        def profiled(*args, **kwargs):
+            if not self.enabled:
+                return method(*args, **kwargs)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another thread is profiled, the profiler can't be shared
+                return method(*args, **kwargs)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._add(profile)
+
+        return profiled
+
+    def wrap_methods(self, instance, *names):
+        """Replace the named methods of instance by profiled ones"""
+        for name in names:
+            setattr(instance, name, self.wrap(getattr(instance, name)))
+
+    def _add(self, profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def set_enabled(self, enabled):
+        """Start or stop profiling, stopping writes what was collected"""
+        if enabled == self.enabled:
+            return
+        if enabled:
+            self.start()
+        else:
+            self.stop()
+
+    def toggle(self):
+        """Switch profiling on or off, for a signal handler"""
+        self.set_enabled(not self.enabled)
+
+    def start(self):
+        """Start profiling and the snapshot timer"""
+        if self.enabled:
+            return
+        tracemalloc.start()
+        self._snapshot = self._take_snapshot()
+        self._stopped.clear()
+        self.enabled = True
+        self._thread = threading.Thread(
+            target=self._run, name="sbRenamer-profiler", daemon=True
+        )
+        self._thread.start()
+        logging.info(
+            "Profiling, writing to %s every %s seconds", self.folder, self.interval
+        )
+
+    def stop(self):
+        """Stop profiling, the last profile and snapshot are written"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.write()
+        tracemalloc.stop()
+        self._snapshot = None
+        logging.info("Stopped profiling")
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        """Write the profile and the allocation diff since the last write"""
+        stamp = time.strftime("%Y%m%d%H%M%S")
+        with self._lock:
+            stats, self._stats = self._stats, None
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            if stats is not None:
+                stats.dump_stats(self.folder / f"{FILE_PREFIX}{stamp}.prof")
+            if tracemalloc.is_tracing():
+                self._write_allocations(self.folder / f"{FILE_PREFIX}{stamp}.txt")
+        except OSError as error:
+            logging.error("Unable to write profile to %s: %s", self.folder, error)
+        self.remove_old_files()
+
+    @staticmethod
+    def _take_snapshot():
+        # Leave out what profiling itself allocates
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, module.__file__)
+                for module in (tracemalloc, cProfile, pstats)
+            ]
+            + [tracemalloc.Filter(False, __file__)]
+        )
+
+    def _write_allocations(self, path):
+        snapshot = self._take_snapshot()
+        differences = snapshot.compare_to(self._snapshot, "lineno")[: self.top]
+        self._snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory {current} bytes, peak {peak} bytes", ""]
+        for difference in differences:
+            frame = difference.traceback[0]
+            lines.append(
+                f"{difference.size_diff:+d} bytes ({difference.count_diff:+d} blocks) "
+                f"{frame.filename}:{frame.lineno}"
+            )
+            source = linecache.getline(frame.filename, frame.lineno).strip()
+            if source:
+                lines.append(f"    {source}")
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def remove_old_files(self):
+        """Keep only the newest keep files of each kind"""
+        for pattern in (f"{FILE_PREFIX}*.prof", f"{FILE_PREFIX}*.txt"):
+            paths = sorted(self.folder.glob(pattern))
+            for path in paths[: max(len(paths) - self.keep, 0)]:
+                try:
+                    path.unlink()
+                except OSError as error:
+                    logging.debug("Unable to remove %s: %s", path, error)
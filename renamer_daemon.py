@@ -0,0 +1,103 @@
+"""Headless entry point, runs the rename engine without tkinter, pystray or PIL
+
+Usage: python -m renamer_daemon --config config.ini
+"""
+
+import argparse
+import logging
+import signal
+import sys
+import threading
+
+from renamer_settings_model import RenamerSettings
+from renamer_engine import RenamerService
+from _version import __version__
+
+CONFIGFILENAME = "config.ini"
+CONSOLE_LOG_FORMAT = {
+    "fmt": "%(asctime)s - %(levelname)s - %(threadName)s - %(message)s",
+    "datefmt": "%Y-%m-%d %H:%M:%S",
+}
+
+
+def parse_args(argv=None):
+    """Parse the command line of the daemon"""
+    parser = argparse.ArgumentParser(
+        prog="renamer_daemon", description="SimBrief Renamer without gui"
+    )
+    parser.add_argument(
+        "--config", default=CONFIGFILENAME, help="settings file (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="accepted for symmetry with the gui, the daemon is always headless",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile from the start, SIGUSR1 switches profiling on and off",
+    )
+    return parser.parse_args(argv)
+
+
+def add_console_logging(level):
+    """Log to stderr, picked up by the journal when running as a service"""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(**CONSOLE_LOG_FORMAT))
+    handler.setLevel(level)
+    logging.getLogger().addHandler(handler)
+    return handler
+
+
+def main(argv=None) -> int:
+    """Run until SIGTERM or SIGINT, returns the exit code"""
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.DEBUG)
+    console = add_console_logging(logging.INFO)
+
+    try:
+        model = RenamerSettings(args.config)
+    except FileNotFoundError as error:
+        logging.critical("%s: %s", error.strerror, error.filename)
+        return 1
+    console.setLevel(model.log_level)
+
+    stop_requested = threading.Event()
+
+    def request_stop(signum, _frame):
+        logging.info("Received signal %d, stopping", signum)
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    service = RenamerService(model)
+    service.set_profiling(args.profile or model.profile)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda _signum, _frame: service.profiler.toggle())
+
+    def settings_reloaded(changed):
+        if "loglevel" in changed:
+            console.setLevel(model.log_level)
+
+    service.start_monitoring()
+    service.create_delete_thread()
+    service.start_metrics()
+    service.start_config_watcher(settings_reloaded)
+    logging.info("Started headless version %s", __version__)
+
+    exit_code = 0
+    while not stop_requested.wait(1):
+        if not service.is_active_monitoring():
+            logging.error("File System Watcher stopped unexpectedly")
+            exit_code = 1
+            break
+
+    service.shutdown()
+    logging.info("Stopped headless version %s", __version__)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1005 @@
+"""Rename engine: file system handlers, file deleter and the service running them
+This module must not import tkinter, pystray or PIL, it is used headless as well
+"""
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import pathlib
+
+from watchdog.observers import Observer
+from watchdog.events import (
+    FileModifiedEvent,
+    FileSystemEventHandler,
+    PatternMatchingEventHandler,
+)
+from watchdog.utils.patterns import match_any_paths
+from renamer_settings_model import RenamerSettings
+from debounce_scheduler import DebounceScheduler
+from file_readiness import wait_until_stable, wait_until_stable_async
+from worker_pool import KeyedLocks, WorkerPool
+from config_watcher import ConfigWatcher
+from file_deleter import FileDeleter
+from xml_header import read_route
+from copy_modes import FileCopier
+from atomic_publish import keep_copy, publish, replace
+from polling_observer import AdaptivePollingObserver
+from catch_up import ProcessedMarker, find_new_files
+from processed_journal import ProcessedJournal, identity
+from content_hash import HashCache
+from metrics import NULL_METRICS, Metrics, MetricsExporter
+from profiler import Profiler
+
+
+class RenamerService:
+    """Runs the observer, rename handler and file deleter, without any gui"""
+
+    def __init__(self, model: RenamerSettings, listener=None):
+        self.model = model
+        self.listener = listener
+        self._observer = None
+        self._handler = None
+        # (folder, recursive) -> watch on the shared observer
+        self._watches = {}
+        self._config_watcher = None
+        self._on_reload = None
+        self.delete_thread = None
+        self._delete_lock = threading.Lock()
+        self._clean_lock = threading.Lock()
+        self._clean_again = False
+        self._retention_handler = RetentionEventHandler(self.retention_event)
+        # Mod 40 Counters and timings, doing nothing when switched off
+        self.metrics = Metrics() if self.model.metrics else NULL_METRICS
+        self.metrics.gauge("threads", threading.active_count)
+        self.metrics.gauge("pending_jobs", self.pending_jobs)
+        self.metrics.gauge("monitoring", lambda: int(self.model.monitoring))
+        self._metrics_exporter = None
+        # Mod 41 Switched on from the settings, the command line or a signal
+        self.profiler = Profiler(
+            self.model.profile_dir,
+            self.model.profile_keep,
+            self.model.profile_interval,
+        )
+        # Mod 38 Processed files are remembered across restarts
+        self.journal = ProcessedJournal(
+            self.model.journal_file, self.model.journal_days
+        )
+
+        self._filedeleters = self.create_file_deleters()
+
+    def create_file_deleters(self):
+        """One file deleter per watched folder, with the retention settings of that folder"""
+        deleters = [
+            FileDeleter(
+                root.source_dir,
+                root.number_of_days,
+                root.delete_batch_size,
+                root.retention_max_bytes,
+                root.retention_max_files,
+                self.metrics,
+            )
+            for root in self.model.watch_roots()
+        ]
+        for deleter in deleters:
+            self.profiler.wrap_methods(deleter, "list_files")
+        return deleters
+
+    def set_profiling(self, enabled):
+        """Start or stop profiling"""
+        self.profiler.set_enabled(enabled)
+
+    def start_metrics(self):
+        """Write the metrics to a file and serve them, when metrics are on"""
+        if not self.metrics.enabled or self._metrics_exporter is not None:
+            return
+        self._metrics_exporter = MetricsExporter(
+            self.metrics,
+            self.model.metrics_file,
+            self.model.metrics_interval,
+            self.model.metrics_port,
+        )
+        self._metrics_exporter.start()
+        logging.info("Writing metrics to %s", self.model.metrics_file)
+
+    def pending_jobs(self):
+        """Jobs waiting for their delay or a worker, 0 when not monitoring"""
+        return self._handler.pending_jobs() if self._handler else 0
+
+    def create_delete_thread(self, delay=10):
+        """Creates a deamon thread to start removing files in delay sec"""
+        with self._delete_lock:
+            if self.delete_thread:
+                self.delete_thread.cancel()
+            self.delete_thread = threading.Timer(delay, self.start_clean)
+            self.delete_thread.daemon = True
+            self.delete_thread.start()
+
+    def start_clean(self):
+        """Start the actual deletion fot files and plan the next sweep"""
+        # One sweep at a time, a trigger during a sweep makes it run once more
+        self._clean_again = True
+        while self._clean_again and self._clean_lock.acquire(blocking=False):
+            try:
+                self._clean_again = False
+                for deleter in self._filedeleters:
+                    deleter.sweep()
+                self.journal.compact()
+            finally:
+                self._clean_lock.release()
+        # Mod 33 Keep cleaning up, unless this timer was replaced or cancelled
+        interval = self.model.retention_interval
+        if interval > 0 and threading.current_thread() is self.delete_thread:
+            self.create_delete_thread(interval)
+
+    def retention_event(self, path, removed=False):
+        """Keep the index of the file deleter in line with the folder"""
+        over_limits = False
+        for deleter in self._filedeleters:
+            if removed:
+                deleter.file_removed(path)
+                continue
+            deleter.file_changed(path)
+            # Mod 34 Enforce size and count limits right away, only the excess is removed
+            over_limits |= deleter.has_limits and deleter.over_limits()
+        if over_limits:
+            self.create_delete_thread(0)
+
+    def start_monitoring(self):
+        """Starts a new observer as deamon whith a the custom rename/delete handler"""
+
+        self._observer, close_write = self.create_observer()
+        # Mod 10 Create Handler with internal listener
+        if self.model.engine == self.model.ENGINE_ASYNCIO:
+            handler_class = AsyncRenameXmlHandler
+        else:
+            handler_class = RenameXmlHandler
+        # Mod 37 The marker tells which files arrived while not monitoring
+        marker = None
+        if self.model.catch_up:
+            marker = ProcessedMarker(self.model.marker_file)
+        self._handler = handler_class(
+            self.model,
+            self.listener,
+            close_write=close_write,
+            marker=marker,
+            journal=self.journal,
+            metrics=self.metrics,
+        )
+        self.profiler.wrap_methods(self._handler, "dispatch", "process_targets")
+        # Mod 35 All watched folders share the observer and the handler
+        roots = [root.snapshot for root in self.model.watch_roots()]
+        self._handler.apply_settings(roots[0], roots)
+        self._watches = {}
+        self.update_watches(roots)
+        self._observer.daemon = True
+        self._observer.start()
+        if marker is not None:
+            # Watching already, a file is missed by neither or seen by both
+            threading.Thread(
+                target=self._handler.catch_up, name="sbRenamer-catch-up", daemon=True
+            ).start()
+
+        self.model.monitoring = True
+        logging.info("Starting File System Watcher")
+
+    def create_observer(self):
+        """Returns observer for the configured backend and if it reports close write"""
+        if self.model.observer_backend == self.model.OBSERVER_POLLING:
+            # Mod 36 Polling for network shares that miss native events
+            patterns = []
+            for root in self.model.watch_roots():
+                patterns += [p for p in root.include_patterns if p not in patterns]
+            logging.info("Polling for %s", "; ".join(patterns))
+            return (
+                AdaptivePollingObserver(
+                    patterns,
+                    self.model.poll_min_interval,
+                    self.model.poll_max_interval,
+                ),
+                False,
+            )
+        if self.model.observer_backend == self.model.OBSERVER_CLOSE_WRITE:
+            if sys.platform.startswith("linux"):
+                # pylint: disable=import-outside-toplevel
+                from watchdog.observers.inotify import InotifyObserver
+
+                logging.info("Using inotify close write events")
+                return InotifyObserver(), True
+            logging.warning(
+                "Close write events need linux inotify, using modified events"
+            )
+        return Observer(), False
+
+    def stop_monitoring(self):
+        """Stops the monitoring thread"""
+
+        self._observer.stop()
+        self._observer.join()
+        self._handler.stop()
+        self.model.monitoring = False
+        logging.info("Stopping File System Watcher")
+
+    def is_active_monitoring(self) -> bool:
+        """Returns observer state"""
+
+        if self._observer:
+            return self._observer.is_alive()
+        # else:
+        logging.warning("Observer is no longer present")
+        return False
+
+    def apply_saved_settings(self):
+        """Follow up on saved settings, the running handler is updated in place"""
+        settings = self.model.snapshot
+        deleters = self.create_file_deleters()
+        if [self.retention_key(deleter) for deleter in deleters] != [
+            self.retention_key(deleter) for deleter in self._filedeleters
+        ]:
+            # Start the new instances with new settings
+            self._filedeleters = deleters
+            self.create_delete_thread()
+
+        if not self.model.monitoring:
+            return
+        # Mod 26 No restart of the observer, so no events are lost
+        roots = [settings] + [root.snapshot for root in self.model.watch_roots()[1:]]
+        self._handler.apply_settings(settings, roots)
+        self.update_watches(roots)
+        logging.info("Applied new settings to running File System Watcher")
+
+    @staticmethod
+    def retention_key(deleter):
+        """Settings of a file deleter, a new one is only needed when they change"""
+        return (
+            pathlib.Path(deleter.folder),
+            deleter.days,
+            deleter.max_bytes,
+            deleter.max_files,
+        )
+
+    def update_watches(self, roots):
+        """Watch new folders before dropping old watches, so nothing is missed"""
+        wanted = [(pathlib.Path(root.source_dir), root.recursive) for root in roots]
+        for index, key in enumerate(wanted):
+            if key in self._watches:
+                continue
+            folder, recursive = key
+            try:
+                self._watches[key] = self._observer.schedule(
+                    self._handler, folder, recursive=recursive
+                )
+            except OSError as error:
+                if index == 0:
+                    raise
+                logging.error("Unable to watch %s: %s", folder, error)
+                continue
+            self._observer.schedule(
+                self._retention_handler, folder, recursive=recursive
+            )
+            logging.info("Watching %s%s", folder, " recursive" if recursive else "")
+        for key in set(self._watches) - set(wanted):
+            self._observer.unschedule(self._watches.pop(key))
+            logging.info("Stopped watching %s", key[0])
+
+    def start_config_watcher(self, on_reload=None):
+        """Reload the ini file when another program changes it, if enabled"""
+        if not self.model.watch_config:
+            return
+        self._on_reload = on_reload
+        self._config_watcher = ConfigWatcher(self.model, self.settings_reloaded)
+        self._config_watcher.start()
+
+    def settings_reloaded(self, changed):
+        """Apply settings that were changed in the ini file on disk"""
+        self.apply_saved_settings()
+        if "profile" in changed:
+            self.set_profiling(self.model.profile)
+        if self.model.monitoring and set(changed) & set(self.model.RESTART_KEYS):
+            logging.info("Restarting File System Watcher to apply new settings")
+            self.stop_monitoring()
+            self.start_monitoring()
+        if self._on_reload:
+            self._on_reload(changed)
+
+    def shutdown(self):
+        """Stop monitoring and any scheduled clean up"""
+        if self.delete_thread:
+            self.delete_thread.cancel()
+            self.delete_thread = None
+        if self._config_watcher:
+            self._config_watcher.stop()
+        if self.is_active_monitoring():
+            self.stop_monitoring()
+        self.journal.close()
+        if self._metrics_exporter is not None:
+            self._metrics_exporter.stop()
+            self._metrics_exporter = None
+        self.profiler.stop()
+
+
+class RetentionEventHandler(FileSystemEventHandler):
+    """Reports every file that appears, changes or disappears in the folder"""
+
+    def __init__(self, on_change):
+        super().__init__()
+        self._on_change = on_change
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._on_change(event.src_path)
+
+    on_modified = on_created
+    on_closed = on_created
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self._on_change(event.src_path, removed=True)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._on_change(event.src_path, removed=True)
+            self._on_change(event.dest_path)
+
+
+class RenameXmlHandler(PatternMatchingEventHandler):
+    """Handler to catch newly created files and rename them"""
+
+    # Set filename pattern, the include setting of a folder replaces it
+    # Mod 15
+    patterns = ["*.xml", "*.fms"]
+    # Mod 19 Only a short quiet period, readiness is checked before processing
+    DELAY_EXECUTION = 0.05
+
+    # 10 Added listener on construct
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        model: RenamerSettings,
+        listener,
+        close_write=False,
+        marker=None,
+        journal=None,
+        metrics=None,
+    ):
+        PatternMatchingEventHandler.__init__(self)
+        self.model = model
+        self.listener = listener
+        # Mod 26 Settings in use, replaced as a whole when new settings are saved
+        self.settings = model.snapshot
+        # Mod 35 (folder, settings) of every watched folder, deepest folder first
+        self.roots = ((pathlib.Path(self.settings.source_dir), self.settings),)
+        # Mod 20 With close write events the writer is done, no need to wait
+        self.close_write = close_write
+        self._delay = 0 if close_write else self.DELAY_EXECUTION
+        # Mod 30 Remembers the fastest copy mode per file system
+        self._copier = FileCopier()
+        # Mod 37 Newest processed modification time per folder, None to keep none
+        self.marker = marker
+        # Mod 38 Processed files and the files written for them, by identity
+        self.journal = journal if journal is not None else ProcessedJournal()
+        # Mod 39 Digests of sources and targets, to skip writing the same content
+        self._hashes = HashCache()
+        self._saved = {"operations": 0, "bytes": 0}
+        self._saved_lock = threading.Lock()
+        self._target_locks = KeyedLocks()
+        # Mod 40
+        self.metrics = metrics or NULL_METRICS
+        self.create_backend()
+
+    def create_backend(self):
+        """Create the objects that delay and execute the jobs"""
+        # Mod 18 One scheduler thread, one pending job per source path
+        self._scheduler = DebounceScheduler()
+        # Mod 21 Due jobs are executed by a bounded pool of workers
+        self._pool = WorkerPool(
+            self.model.worker_count, self.model.queue_size, self.model.queue_overflow
+        )
+
+    def execute_with_delay(self, method_to_execute, event, *args):
+        """Default wrapper for delayed execution, keyed on the event source path"""
+        if not self._delay:
+            self.submit_job(method_to_execute, event, *args)
+            return
+        self._scheduler.schedule(
+            event.src_path,
+            self._delay,
+            self.submit_job,
+            method_to_execute,
+            event,
+            *args,
+        )
+
+    def apply_settings(self, settings, roots=None):
+        """Use settings for events from now on, queued jobs keep their own"""
+        roots = roots or [settings]
+        self.roots = tuple(
+            sorted(
+                ((pathlib.Path(root.source_dir), root) for root in roots),
+                key=lambda root: len(root[0].parts),
+                reverse=True,
+            )
+        )
+        self.settings = settings
+
+    def settings_for(self, path):
+        """Settings of the watched folder path is in, None when it is not watched"""
+        for folder, settings in self.roots:
+            if path.parent == folder:
+                return settings
+            if settings.recursive and folder in path.parents:
+                return settings
+        return None
+
+    def accepts(self, path):
+        """Settings of the folder that includes path and doesn't exclude it, or None"""
+        path = pathlib.Path(os.fsdecode(path))
+        settings = self.settings_for(path)
+        if settings is None:
+            return None
+        relative = str(path.relative_to(pathlib.Path(settings.source_dir)))
+        if match_any_paths(
+            [relative],
+            included_patterns=settings.include_patterns,
+            excluded_patterns=settings.exclude_patterns,
+            case_sensitive=False,
+        ):
+            return settings
+        return None
+
+    def dispatch(self, event):
+        """Only pass on events for files that the folder includes and not excludes"""
+        if event.is_directory:
+            return
+        if self.accepts(event.src_path) is not None:
+            FileSystemEventHandler.dispatch(self, event)
+
+    def catch_up(self):
+        """
+        Handle the files that are newer than the marker of their folder and
+        not in the journal, the same way as an event for them,
+        returns scan statistics
+        """
+        started = time.monotonic()
+        # Files modified before this may have dropped out of the journal
+        remembered = time.time_ns() - int(self.journal.max_days * 24 * 60 * 60 * 1e9)
+        found = []
+        for folder, settings in self.roots:
+            since = self.marker.get(folder)
+            files = find_new_files(
+                folder,
+                since if since is None else max(since, remembered),
+                settings.recursive,
+                lambda path, settings=settings: self.accepts(path) is settings,
+            )
+            if since is None:
+                # Never watched before, only remember how far the folder is
+                self.marker.update(folder, files[-1][0] if files else 0)
+                continue
+            found += [
+                (mtime, path) for mtime, path in files if not self.journal.seen(path)
+            ]
+        # Oldest first, a later download of the same target wins like it does live
+        found.sort()
+        for _, path in found:
+            self.process_existing(path)
+        stats = {"queued": len(found), "seconds": time.monotonic() - started}
+        logging.info(
+            "Catch-up scan of %d folders found %d new files in %d ms",
+            len(self.roots),
+            stats["queued"],
+            stats["seconds"] * 1000,
+        )
+        return stats
+
+    def process_existing(self, path):
+        """Handle a file that is there already as if it was just written"""
+        self.handle_new_file(FileModifiedEvent(path))
+
+    def postpone(self, key) -> bool:
+        """Push back a pending job for key, returns False if there is none"""
+        return self._scheduler.touch(key, self._delay)
+
+    def submit_job(self, method_to_execute, event, *args):
+        """
+        Hand job to the worker pool, jobs for one source never run together
+        Targets can depend on the content, so they are locked in the job
+        """
+        self._pool.submit(
+            method_to_execute,
+            event,
+            *args,
+            key=event.src_path,
+            group=event.src_path,
+        )
+
+    def stop(self):
+        """Stop accepting events, returns after the pending jobs are executed"""
+        self._scheduler.stop()
+        self._scheduler.join()
+        # The journal and the metrics are closed after this, so wait for the last job
+        self._pool.shutdown(wait=True)
+        stats = self._pool.stats()
+        logging.info(
+            "Worker pool handled %d jobs, max queue depth %d, "
+            "average wait %d ms, max wait %d ms, %d dropped",
+            stats["completed"] + stats["failed"],
+            stats["max_depth"],
+            stats["avg_wait"] * 1000,
+            stats["max_wait"] * 1000,
+            stats["dropped"],
+        )
+        self.log_saved()
+
+    def pending_jobs(self):
+        """Jobs waiting for their delay or a worker"""
+        return self._scheduler.pending() + self._pool.depth()
+
+    def log_saved(self):
+        """Log how much writing was saved by skipping identical content"""
+        logging.info(
+            "Skipped %d copies and renames of identical content, saved %d bytes",
+            self._saved["operations"],
+            self._saved["bytes"],
+        )
+
+    def on_modified(self, event):
+        if self.close_write:
+            return
+        self.metrics.inc("events_received")
+        logging.info("Trigger modified file: %s", (event.src_path))
+
+        # Mod 18 Still being written, wait for the file to settle
+        if self.postpone(event.src_path):
+            return
+
+        self.handle_new_file(event)
+
+    # Mod 20
+    def on_closed(self, event):
+        if not self.close_write:
+            return
+        self.metrics.inc("events_received")
+        logging.info("Trigger closed file: %s", (event.src_path))
+        self.handle_new_file(event)
+
+    def handle_new_file(self, event):
+        """Schedule copy or rename of the file in event, unless it is ignored"""
+        received = time.monotonic()
+        newfile_path = pathlib.Path(event.src_path)
+
+        # Mod 38 Files that were processed or written by us are in the journal
+        if self.journal.seen(newfile_path):
+            logging.debug(
+                "Ignoring the %s (created or processed already)", newfile_path.stem
+            )
+            self.metrics.inc("events_ignored")
+            return
+
+        # Mod 25 One consistent set of settings for the whole job
+        settings = self.settings_for(newfile_path) or self.settings
+        # Mod 28 Targets come from the compiled filename rules
+        if not settings.handles(newfile_path.name):
+            logging.debug("No filename rule for %s", newfile_path.name)
+            self.metrics.inc("events_ignored")
+            return
+        self.execute_with_delay(self.process_targets, event, received, settings)
+
+    def process_targets(self, event, received=None, settings=None):
+        """Wait for the source, then write its targets while holding their locks"""
+        settings = settings or self.settings
+        source = pathlib.Path(event.src_path)
+        # An earlier job for the same file may have handled it already
+        if self.journal.seen(source):
+            logging.debug("Ignoring the %s (processed already)", source.stem)
+            self.metrics.inc("events_ignored")
+            return
+        # Mod 19
+        if not self.wait_until_ready(source, settings.ready_timeout):
+            return
+        try:
+            source_identity = identity(source)
+        except OSError:
+            logging.warning("%s disappeared before processing", source.name)
+            return
+        # Mod 29 The route is read from the complete file, only when needed
+        target_filenames = settings.target_names(
+            source.name, functools.partial(read_route, source)
+        )
+        if not target_filenames:
+            logging.warning("No target name for %s", source.name)
+            return
+        # Mod 42 Jobs wait for each other only when they share the source or a target
+        targets = [source.parent / name for name in target_filenames]
+        with self._target_locks.hold(
+            os.path.normcase(os.path.abspath(path)) for path in [source] + targets
+        ):
+            # A job for the same source may have finished while this one waited
+            if self.journal.seen(source):
+                logging.debug("Ignoring the %s (processed already)", source.stem)
+                self.metrics.inc("events_ignored")
+                return
+            self.write_targets(event, source_identity, targets, received, settings)
+
+    # pylint: disable-next=too-many-arguments
+    def write_targets(self, event, source_identity, targets, received, settings):
+        """Copy to every target, the last one is renamed into when configured"""
+        source = pathlib.Path(event.src_path)
+        *copies, last = [target.name for target in targets]
+        written = [
+            self.copy_shortend(event, target_filename, received, settings)
+            for target_filename in copies
+        ]
+        if settings.renames(source.name):
+            written.append(self.rename_shortend(event, last, received, settings))
+        else:
+            written.append(self.copy_shortend(event, last, received, settings))
+        if not all(written):
+            # Not recorded, a later event or catch-up tries again
+            logging.warning("Not every target written for %s", source.name)
+            return
+        # Events for the targets find them in the journal and are ignored
+        self.journal.record([source_identity])
+        self.journal.record_files(targets)
+
+    def wait_until_ready(self, file_path, timeout) -> bool:
+        """Wait for the writer to finish, returns False if the file is gone"""
+        if self.close_write:
+            return self.source_exists(file_path)
+        started = time.monotonic()
+        try:
+            ready = wait_until_stable(file_path, timeout)
+            self.metrics.observe(
+                "stage_seconds", time.monotonic() - started, stage="ready"
+            )
+            if not ready:
+                logging.warning(
+                    "%s still changing after %s seconds, processing anyway",
+                    file_path.name,
+                    timeout,
+                )
+        except FileNotFoundError:
+            logging.warning("%s disappeared before processing", file_path.name)
+            return False
+        return True
+
+    def source_exists(self, file_path) -> bool:
+        """Returns False, with a warning, when the file is gone"""
+        if file_path.is_file():
+            return True
+        logging.warning("%s disappeared before processing", file_path.name)
+        return False
+
+    def log_latency(self, file_name, received):
+        """Log time between the first event and the finished copy or rename"""
+        if received is not None:
+            self.metrics.observe("processing_seconds", time.monotonic() - received)
+            logging.info(
+                "Processed %s in %d ms",
+                file_name,
+                (time.monotonic() - received) * 1000,
+            )
+
+    def copy_shortend(
+        self, event, target_filename, received=None, settings=None
+    ) -> bool:
+        """copy based on event source path, False when the target isn't written"""
+
+        logging.debug("Start copy target %s", target_filename)
+        settings = settings or self.settings
+        newfile_path = pathlib.Path(event.src_path)
+        filename = newfile_path.stem
+        if not self.source_exists(newfile_path):
+            return False
+        # 10 Change destFile into Path, to use pathib functions
+        dest_file = pathlib.Path(newfile_path.parent / target_filename)
+
+        # mod 16
+        if self.destination_equals_source(dest_file, newfile_path):
+            return True
+        # Mod 39 A download of the same OFP leaves the target alone
+        if self.same_content(newfile_path, dest_file):
+            return True
+
+        if settings.save_existing_target and dest_file.is_file():
+            logging.info("Destination file exits")
+            if not self.keep_existing_file(dest_file):
+                return False
+
+        started = time.monotonic()
+        try:
+            # Mod 31 Copied under a temporary name, then replaced in one step
+            copy_mode = publish(
+                dest_file,
+                functools.partial(
+                    self._copier.copy, newfile_path, mode=settings.copy_mode
+                ),
+                settings.fsync_policy,
+            )
+            self.metrics.observe(
+                "stage_seconds", time.monotonic() - started, stage="copy"
+            )
+            self.metrics.inc("files_copied")
+            logging.info(
+                "filename: %s copied to %s (%s)", filename, dest_file.name, copy_mode
+            )
+            self.log_latency(dest_file.name, received)
+            # 10 If the listener is assigned, activate it with correct message
+            if self.listener:
+                self.listener(
+                    f"filename: {filename} copied to {dest_file.name}",
+                    "sbRenamer",
+                )
+
+        except OSError as err:
+            logging.error(
+                "Unable to copy %s to %s, error: %s", filename, dest_file, err
+            )
+            self.metrics.inc("errors", stage="copy")
+            return False
+        return True
+
+    # Mod 16
+    def destination_equals_source(self, dest_file, source_file):
+        """Check if files are the same (and existing)"""
+        logging.debug("check if equal")
+        if dest_file.is_file():
+            return_value = dest_file.name == source_file.name
+        else:
+            return_value = False
+        logging.debug("Equal check returns %s", return_value)
+        return return_value
+
+    def same_content(self, source_file, dest_file) -> bool:
+        """True when dest_file has the content of source_file, counted as saved"""
+        if not self._hashes.same_content(source_file, dest_file):
+            return False
+        try:
+            size = source_file.stat().st_size
+        except OSError:
+            size = 0
+        with self._saved_lock:
+            self._saved["operations"] += 1
+            self._saved["bytes"] += size
+        logging.info(
+            "%s has the same content as %s, skipped %d bytes",
+            dest_file.name,
+            source_file.name,
+            size,
+        )
+        return True
+
+    def rename_shortend(
+        self, event, target_filename, received=None, settings=None
+    ) -> bool:
+        """Rename the created file, False when the target isn't written"""
+        # This method needs to move to the Renamer model??
+        logging.debug("Start rename")
+        settings = settings or self.settings
+        new_file_path = pathlib.Path(event.src_path)
+        filename = new_file_path.stem
+        if not self.source_exists(new_file_path):
+            return False
+        # 10 Change destFile into Path, to use pathib functions
+        dest_file = pathlib.Path(new_file_path.parent / target_filename)
+
+        # Mod 16
+        if self.destination_equals_source(dest_file, new_file_path):
+            return True
+        # Mod 39 The target has this content already, the download isn't needed
+        if self.same_content(new_file_path, dest_file):
+            try:
+                os.remove(new_file_path)
+            except OSError as err:
+                logging.error("Unable to remove %s, error: %s", filename, err)
+            return True
+
+        if dest_file.is_file():
+            if not self.handle_existing_destination(
+                dest_file, settings.save_existing_target
+            ):
+                return False
+
+        started = time.monotonic()
+        try:
+            # Mod 31 The old target stays in place until it is replaced
+            replace(new_file_path, dest_file, settings.fsync_policy)
+            self.metrics.observe(
+                "stage_seconds", time.monotonic() - started, stage="rename"
+            )
+            self.metrics.inc("files_renamed")
+            logging.info("filename: %s renamed to %s", filename, dest_file.name)
+            self.log_latency(dest_file.name, received)
+            # 10 If the listener is assigned, activate it with correct message
+            if self.listener:
+                self.listener(
+                    f"filename: {filename} renamed to {dest_file.name}",
+                    "sbRenamer",
+                )
+
+        except OSError as err:
+            logging.error(
+                "Unable to rename %s to %s, error: %s", filename, dest_file, err
+            )
+            self.metrics.inc("errors", stage="rename")
+            return False
+        return True
+
+    def handle_existing_destination(self, dest_file, save_existing_target) -> bool:
+        """Keeps a copy of the exisiting file, returns False when that fails"""
+        logging.debug("Destination file exits")
+        if save_existing_target:
+            logging.debug("Keeping Existing Destination")
+            return self.keep_existing_file(dest_file)
+        logging.debug("Existing Destination will be replaced")
+        return True
+
+    def keep_existing_file(self, file_to_keep) -> bool:
+        """keeps file under samename with datetime, the file itself stays in place"""
+
+        logging.debug("Keeping datetime version of file")
+        backup_file = file_to_keep.parent / pathlib.Path(
+            file_to_keep.stem
+            + "_"
+            + time.strftime("%Y%m%d%H%M%S")
+            + file_to_keep.suffix
+        )
+        try:
+            keep_copy(file_to_keep, backup_file)
+        except OSError as error:
+            logging.error("problem with keeping existing file, not replacing it")
+            logging.error(error)
+            self.metrics.inc("errors", stage="backup")
+            return False
+        self.metrics.inc("backups")
+        self.journal.record_files([backup_file])
+        logging.info("Kept existing file as %s", backup_file.name)
+        return True
+
+
+# Mod 22
+class AsyncRenameXmlHandler(RenameXmlHandler):
+    """
+    Handler that runs the delay, readiness check and jobs on one asyncio loop
+    Watchdog events are handed over to the loop thread,
+    the blocking copy and rename methods run on a small executor
+    asyncio is only imported when this engine is used, it is slow to import
+    """
+
+    def create_backend(self):
+        # pylint: disable=import-outside-toplevel
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        # source path -> (timer handle, method, args, merged events)
+        self._pending = {}
+        self._tasks = set()
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.model.worker_count, thread_name_prefix="sbRenamer-io"
+        )
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever, name="sbRenamer-loop", daemon=True
+        )
+        self._loop_thread.start()
+
+    def dispatch(self, event):
+        """Called on the observer thread, handle the event on the loop"""
+        self._loop.call_soon_threadsafe(super().dispatch, event)
+
+    def process_existing(self, path):
+        """Called on the catch-up thread, handle the file on the loop"""
+        try:
+            self._loop.call_soon_threadsafe(super().process_existing, path)
+        except RuntimeError:
+            logging.warning("Handler stopped, not processing %s", path)
+
+    def pending_jobs(self):
+        return len(self._pending) + len(self._tasks)
+
+    def postpone(self, key) -> bool:
+        pending = self._pending.get(key)
+        if pending is None:
+            return False
+        handle, method_to_execute, args, merged = pending
+        handle.cancel()
+        self._pending[key] = (
+            self._loop.call_later(self._delay, self._start_job, key),
+            method_to_execute,
+            args,
+            merged + 1,
+        )
+        logging.debug("Postponed job for %s, %d events merged", key, merged + 1)
+        return True
+
+    def execute_with_delay(self, method_to_execute, event, *args):
+        if self._stopping:
+            logging.warning("Handler stopped, not scheduling %s", event.src_path)
+            return
+        key = event.src_path
+        merged = 0
+        pending = self._pending.get(key)
+        if pending is not None:
+            # A job for this file is waiting already, the new event replaces it
+            pending[0].cancel()
+            merged = pending[3] + 1
+        self._pending[key] = (
+            self._loop.call_later(self._delay, self._start_job, key),
+            method_to_execute,
+            (event,) + args,
+            merged,
+        )
+
+    def _start_job(self, key):
+        """Timer callback, run the pending job for key as a task"""
+        _, method_to_execute, args, merged = self._pending.pop(key)
+        if merged:
+            logging.info("Processing %s, merged %d events", key, merged)
+        task = self._loop.create_task(self._run_job(method_to_execute, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_job(self, method_to_execute, event, received=None, settings=None):
+        """Wait for the file, then copy or rename it on the executor"""
+        settings = settings or self.settings
+        source = pathlib.Path(event.src_path)
+        if self.journal.seen(source):
+            logging.debug("Ignoring the %s (processed already)", source.stem)
+            self.metrics.inc("events_ignored")
+            return
+        if not self.close_write:
+            started = time.monotonic()
+            try:
+                ready = await wait_until_stable_async(source, settings.ready_timeout)
+                self.metrics.observe(
+                    "stage_seconds", time.monotonic() - started, stage="ready"
+                )
+            except FileNotFoundError:
+                logging.warning("%s disappeared before processing", source.name)
+                return
+            if not ready:
+                logging.warning(
+                    "%s still changing after %s seconds, processing anyway",
+                    source.name,
+                    settings.ready_timeout,
+                )
+        # The job locks its source and targets, other files are handled meanwhile
+        try:
+            await self._loop.run_in_executor(
+                None,
+                method_to_execute,
+                event,
+                received,
+                settings,
+            )
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Job for %s failed", event.src_path)
+
+    def wait_until_ready(self, file_path, timeout) -> bool:
+        """Readiness was awaited on the loop, only check the file is still there"""
+        return self.source_exists(file_path)
+
+    async def _drain(self):
+        """Let pending and running jobs finish"""
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        self._stopping = True
+        while self._pending or self._tasks:
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            else:
+                await asyncio.sleep(self._delay)
+
+    def stop(self):
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=True)
+        self.log_saved()
+        logging.info("Stopped asyncio engine")
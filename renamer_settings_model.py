@@ -5,11 +5,18 @@
  """
 import logging
 import configparser
+import hashlib
 import pathlib
 import errno
 import os
 import re
+import threading
+from typing import NamedTuple
 
+from atomic_publish import FSYNC_NEVER
+from copy_modes import COPY_AUTO
+from file_deleter import parse_file_limits, parse_size
+from filename_rules import FilenameRule, FilenameRules, RuleError
 from listener_logger_handler import LoggerHandler
 
 
@@ -27,6 +34,34 @@ class RenamerSettings:
     FMS_B738 = "b738x"
     FMS_BOTH = "BOTH"
     FMS_OPTIONS = [FMS_NO, FMS_B738, FMS_BOTH]
+    # Targets of the built-in formats, other file formats are used as template
+    FORMAT_TEMPLATES = {
+        B738_FORMAT: "b738x.xml",
+        SHORT_FORMAT: "{orig}{dest}.xml",
+        ZERO_FORMAT: "{orig}{dest}01.xml",
+    }
+    FMS_TEMPLATE = "b738x.fms"
+    RULES_SECTION = "FilenameRules"
+    # Extra watched folders are sections named Watch:<name>
+    WATCH_PREFIX = "Watch:"
+    DEFAULT_INCLUDE = "*.xml; *.fms"
+    OBSERVER_NATIVE = "native"
+    OBSERVER_CLOSE_WRITE = "close_write"
+    OBSERVER_POLLING = "polling"
+    OBSERVER_BACKENDS = [OBSERVER_NATIVE, OBSERVER_CLOSE_WRITE, OBSERVER_POLLING]
+    ENGINE_THREADS = "threads"
+    ENGINE_ASYNCIO = "asyncio"
+    ENGINES = [ENGINE_THREADS, ENGINE_ASYNCIO]
+    # Settings that only take effect when the listener is restarted
+    RESTART_KEYS = [
+        "engine",
+        "observer_backend",
+        "poll_min_interval",
+        "poll_max_interval",
+        "worker_count",
+        "queue_size",
+        "queue_overflow",
+    ]
 
     WIDGIT_LOG_FORMAT = {
         "fmt": "%(asctime)s - %(levelname)s - %(message)s",
@@ -47,12 +82,18 @@ class RenamerSettings:
                 errno.ENOENT, os.strerror(errno.ENOENT), cnf_file_name
             )
         self._dirty = False
+        # Compiled on first use, dropped when a value changes
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
         self._monitoring = False
         self._call_back = None
         self._log_file_handler = None
         self._log_listener = None
 
         self._ini_file_name = cnf_file_name
+        # Used by reload to skip files that did not change
+        self._loaded_signature = self._file_signature()
+        self._loaded_digest = None
         self._log_handler = LoggerHandler(logging.INFO, self.WIDGIT_LOG_FORMAT)
         self._add_loghandler_to_logger()
         self._set_file_logging()
@@ -71,7 +112,9 @@ class RenamerSettings:
                 self._config["BaseSettings"].get(key),
             )
             return False
-        self._config["BaseSettings"][key] = value
+        with self._snapshot_lock:
+            self._config["BaseSettings"][key] = value
+            self._snapshot = None
         self._dirty = True
         if self._call_back:
             self._call_back()
@@ -79,6 +122,79 @@ class RenamerSettings:
         logging.debug("SetValue: %s set to: %s", key, value)
         return True
 
+    def compile_snapshot(self):
+        """Convert the current settings once into an immutable snapshot"""
+        return SettingsSnapshot(
+            source_dir=self.source_dir,
+            file_format=self.file_format,
+            fms_format=self.fms_format,
+            save_xml=self.save_xml,
+            save_existing_target=self.save_existing_target,
+            number_of_days=int(self.number_of_days),
+            ready_timeout=self.ready_timeout,
+            copy_mode=self.copy_mode,
+            fsync_policy=self.fsync_policy,
+            rules=self.compile_rules(),
+            recursive=self.recursive,
+            include_patterns=self.include_patterns,
+            exclude_patterns=self.exclude_patterns,
+        )
+
+    def watch_roots(self):
+        """
+        Settings of every watched folder, these settings first
+        Watch:<name> sections only need the keys that differ from BaseSettings
+        """
+        roots = [self]
+        folders = {self.source_dir}
+        for section in self._config.sections():
+            if not section.startswith(self.WATCH_PREFIX):
+                continue
+            root = WatchRootSettings(self, section)
+            if root.source_dir in folders:
+                logging.error(
+                    "Ignoring %s, %s is watched already", section, root.source_dir
+                )
+                continue
+            folders.add(root.source_dir)
+            roots.append(root)
+        return roots
+
+    def compile_rules(self):
+        """
+        Rules from the FilenameRules section first, followed by
+        the rules for the chosen file format and fms format
+        """
+        rules = []
+        if self._config.has_section(self.RULES_SECTION):
+            for name, definition in self._config[self.RULES_SECTION].items():
+                try:
+                    rules.append(FilenameRule.parse(name, definition))
+                except RuleError as error:
+                    logging.error("Ignoring filename rule: %s", error)
+        template = self.FORMAT_TEMPLATES.get(self.file_format, self.file_format)
+        try:
+            rules.append(FilenameRule("file_format", "*.xml", [template]))
+        except RuleError as error:
+            logging.error("Invalid file format: %s", error)
+        if self.fms_format != self.FMS_NO:
+            rules.append(FilenameRule("fms_format", "*.fms", [self.FMS_TEMPLATE]))
+        return FilenameRules(rules)
+
+    @property
+    def snapshot(self):
+        """
+        Settings as they are now, a new snapshot replaces the old one on every change
+        so a reader that holds on to one never sees half applied settings
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._snapshot_lock:
+                if self._snapshot is None:
+                    self._snapshot = self.compile_snapshot()
+                snapshot = self._snapshot
+        return snapshot
+
     @property
     def dirty(self):
         """Indicates if a setting has changed but not saved yet"""
@@ -171,6 +287,179 @@ class RenamerSettings:
         """property to indicate if a existing target may be copied over"""
         return self._config["BaseSettings"].getboolean("save_existing", False)
 
+    @property
+    def ready_timeout(self):
+        """Max seconds to wait for a new file to stop changing before it is processed"""
+        return self._config["BaseSettings"].getfloat("ready_timeout", 10.0)
+
+    @property
+    def recursive(self):
+        """Also watch the folders below source_dir"""
+        return self._config["BaseSettings"].getboolean("recursive", False)
+
+    @property
+    def include_patterns(self):
+        """File name patterns that are processed"""
+        return self._split_patterns(
+            self._config["BaseSettings"].get("include", self.DEFAULT_INCLUDE)
+        )
+
+    @property
+    def exclude_patterns(self):
+        """Patterns of files or sub folders like backup/* that are skipped"""
+        return self._split_patterns(self._config["BaseSettings"].get("exclude", ""))
+
+    @staticmethod
+    def _split_patterns(text):
+        return tuple(pattern.strip() for pattern in text.split(";") if pattern.strip())
+
+    @property
+    def observer_backend(self):
+        """Which file system events trigger processing, close_write only works on linux"""
+        return self._config["BaseSettings"].get(
+            "observer_backend", self.OBSERVER_NATIVE
+        )
+
+    @property
+    def poll_min_interval(self):
+        """Seconds between polls while files change, polling backend only"""
+        return self._config["BaseSettings"].getfloat("poll_min_interval", 0.25)
+
+    @property
+    def poll_max_interval(self):
+        """Longest seconds between polls when nothing changes, polling backend only"""
+        return self._config["BaseSettings"].getfloat("poll_max_interval", 5.0)
+
+    @property
+    def catch_up(self):
+        """Handle files that arrived while not monitoring when monitoring starts"""
+        return self._config["BaseSettings"].getboolean("catch_up", True)
+
+    @property
+    def marker_file(self):
+        """File with the newest processed modification time per watched folder"""
+        return pathlib.Path(self._ini_file_name).with_suffix(".marker")
+
+    @property
+    def journal_file(self):
+        """Append only journal of the processed files"""
+        return pathlib.Path(self._ini_file_name).with_suffix(".journal")
+
+    @property
+    def journal_days(self):
+        """Days a processed file is remembered in the journal"""
+        return self._config["BaseSettings"].getint("journal_days", 7)
+
+    @property
+    def metrics(self):
+        """Count events, copies, renames and deletes and time every stage"""
+        return self._config["BaseSettings"].getboolean("metrics", False)
+
+    @property
+    def metrics_file(self):
+        """Prometheus text file the metrics are written to"""
+        return self._config["BaseSettings"].get("metrics_file", "metrics.prom")
+
+    @property
+    def metrics_interval(self):
+        """Seconds between writes of the metrics file"""
+        return self._config["BaseSettings"].getfloat("metrics_interval", 15.0)
+
+    @property
+    def metrics_port(self):
+        """Serve the metrics on http://127.0.0.1:port/metrics, 0 for no server"""
+        return self._config["BaseSettings"].getint("metrics_port", 0)
+
+    @property
+    def profile(self):
+        """Profile the handler and the clean up, for slow or growing installs"""
+        return self._config["BaseSettings"].getboolean("profile", False)
+
+    @property
+    def profile_dir(self):
+        """Folder for the profiles and allocation diffs, the folder of the log file"""
+        return pathlib.Path(self.LOGFILENAME).resolve().parent
+
+    @property
+    def profile_keep(self):
+        """Number of profiles and allocation diffs that are kept"""
+        return self._config["BaseSettings"].getint("profile_keep", 10)
+
+    @property
+    def profile_interval(self):
+        """Seconds between writing profiles and allocation diffs"""
+        return self._config["BaseSettings"].getfloat("profile_interval", 60.0)
+
+    @property
+    def engine(self):
+        """Processing engine, threads or asyncio"""
+        return self._config["BaseSettings"].get("engine", self.ENGINE_THREADS)
+
+    @property
+    def watch_config(self):
+        """Reload the settings when the ini file is changed by another program"""
+        return self._config["BaseSettings"].getboolean("watch_config", True)
+
+    @property
+    def config_file(self):
+        """Name of the ini file the settings are read from"""
+        return self._ini_file_name
+
+    @property
+    def worker_count(self):
+        """Number of threads that copy and rename files"""
+        return self._config["BaseSettings"].getint("worker_count", 2)
+
+    @property
+    def queue_size(self):
+        """Max number of jobs waiting for a worker"""
+        return self._config["BaseSettings"].getint("queue_size", 100)
+
+    @property
+    def queue_overflow(self):
+        """What to do when the job queue is full: block, drop_oldest or coalesce"""
+        return self._config["BaseSettings"].get("queue_overflow", "block")
+
+    @property
+    def retention_interval(self):
+        """Seconds between clean up sweeps, 0 only cleans up after start"""
+        return self._config["BaseSettings"].getint("retention_interval", 300)
+
+    @property
+    def retention_max_bytes(self):
+        """Maximum size of the folder like 2GB, 0 for no limit"""
+        text = self._config["BaseSettings"].get("retention_max_size", "")
+        try:
+            return parse_size(text)
+        except ValueError:
+            logging.error("Ignoring invalid retention_max_size %s", text)
+            return 0
+
+    @property
+    def retention_max_files(self):
+        """Maximum number of files per pattern like *.xml=200; b738x_*.xml=50"""
+        text = self._config["BaseSettings"].get("retention_max_files", "")
+        try:
+            return parse_file_limits(text)
+        except ValueError as error:
+            logging.error("Ignoring invalid retention_max_files: %s", error)
+            return {}
+
+    @property
+    def delete_batch_size(self):
+        """Number of files unlinked per batch on a worker thread, 0 deletes inline"""
+        return self._config["BaseSettings"].getint("delete_batch_size", 0)
+
+    @property
+    def copy_mode(self):
+        """How targets are copied: auto, reflink, copy_file_range, hardlink or copy"""
+        return self._config["BaseSettings"].get("copy_mode", COPY_AUTO)
+
+    @property
+    def fsync_policy(self):
+        """Flush published targets to disk: never, file or directory"""
+        return self._config["BaseSettings"].get("fsync", FSYNC_NEVER)
+
     @property
     def log_level(self):
         """property to set log level, DEBUG,INFO, WARINING,"""
@@ -179,14 +468,18 @@ class RenamerSettings:
     @log_level.setter
     def log_level(self, value):
         if self.__set_value("loglevel", value):
-            if self._log_file_handler:
-                self._log_file_handler.setLevel(self.log_level)
+            self._apply_log_level()
+
+    def _apply_log_level(self):
+        """Set the level of the file handler to the log_level setting"""
+        if self._log_file_handler:
+            self._log_file_handler.setLevel(self.log_level)
 
-            # Base loghandler is always lowest level
-            logging.getLogger().setLevel(logging.DEBUG)
-            # Widget handler should always be on INFO
-            self._log_handler.setLevel(logging.INFO)
-            logging.info("Altered log level to %s", self.log_level)
+        # Base loghandler is always lowest level
+        logging.getLogger().setLevel(logging.DEBUG)
+        # Widget handler should always be on INFO
+        self._log_handler.setLevel(logging.INFO)
+        logging.info("Altered log level to %s", self.log_level)
 
     @property
     def log_to_file(self):
@@ -261,23 +554,179 @@ class RenamerSettings:
             self._dirty = False
             if self._call_back:
                 self._call_back()
+        self._loaded_signature = self._file_signature()
+
+    def _file_signature(self):
+        """Modification time and size of the ini file, None if it can't be read"""
+        try:
+            stat = os.stat(self._ini_file_name)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _extra_sections(config):
+        """Sections other than BaseSettings as plain dictionaries"""
+        return {
+            section: dict(config.items(section, raw=True))
+            for section in config.sections()
+            if section != "BaseSettings"
+        }
+
+    def reload(self):
+        """
+        Read the ini file again if it changed on disk and apply only the changed values
+        Returns the names of the changed settings
+        """
+        signature = self._file_signature()
+        if signature is None or signature == self._loaded_signature:
+            return []
+        self._loaded_signature = signature
+        try:
+            with open(self._ini_file_name, encoding="utf-8") as ini_file:
+                content = ini_file.read()
+        except OSError as error:
+            logging.error("Unable to read %s: %s", self._ini_file_name, error)
+            return []
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        if digest == self._loaded_digest:
+            logging.debug("Content of %s did not change", self._ini_file_name)
+            return []
+
+        new_config = configparser.ConfigParser()
+        try:
+            new_config.read_string(content, source=self._ini_file_name)
+        except configparser.Error as error:
+            logging.error("Ignoring invalid %s: %s", self._ini_file_name, error)
+            return []
+        if not new_config.has_section("BaseSettings"):
+            logging.error("Ignoring %s without BaseSettings", self._ini_file_name)
+            return []
+        self._loaded_digest = digest
+
+        current = self._config["BaseSettings"]
+        loaded = new_config["BaseSettings"]
+        changed = sorted(
+            key
+            for key in set(current) | set(loaded)
+            if current.get(key) != loaded.get(key)
+        )
+        current_sections = self._extra_sections(self._config)
+        loaded_sections = self._extra_sections(new_config)
+        changed.extend(
+            sorted(
+                section
+                for section in set(current_sections) | set(loaded_sections)
+                if current_sections.get(section) != loaded_sections.get(section)
+            )
+        )
+        if not changed:
+            return []
+        if self._dirty:
+            logging.warning(
+                "Unsaved changes are overwritten by %s", self._ini_file_name
+            )
+        with self._snapshot_lock:
+            for key in changed:
+                if key in current_sections or key in loaded_sections:
+                    self._config.remove_section(key)
+                    if key in loaded_sections:
+                        self._config[key] = loaded_sections[key]
+                elif key in loaded:
+                    current[key] = loaded[key]
+                else:
+                    current.pop(key)
+            self._snapshot = None
+
+        if "loglevel" in changed:
+            self._apply_log_level()
+        if "log_to_file" in changed:
+            self._set_file_logging()
+        logging.info(
+            "Reloaded %s, changed: %s", self._ini_file_name, ", ".join(changed)
+        )
+        if self._call_back:
+            self._call_back()
+        return changed
 
     # debatable if this is really af method of this class
     def new_filename(self, current_filename):
         """returns target filename based on format"""
-        if self.file_format == self.SHORT_FORMAT:
-            return pathlib.Path(current_filename[:8] + ".xml")
-        if self.file_format == self.ZERO_FORMAT:
-            return pathlib.Path(current_filename[:8] + "01.xml")
-
-        # Mod 15
-        if self.file_format == self.B738_FORMAT:
-            return pathlib.Path("b738x.xml")
+        return self.snapshot.new_filename(current_filename)
 
     def fms_filename(self):
         """function that returs the fms filename"""
-        return pathlib.Path("b738x.fms")
+        return self.snapshot.fms_filename()
 
     def validate_number(self, value):
         """function to validate if a string contains a positive number"""
         return bool(re.search(r"\d", value))
+
+
+class WatchRootSettings(RenamerSettings):
+    """
+    Read only settings of an extra watched folder, a Watch:<name> section
+    on top of BaseSettings. Filename rules are shared with the main settings
+    """
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, settings: RenamerSettings, section):
+        self.name = section[len(self.WATCH_PREFIX) :]
+        # pylint: disable=protected-access
+        config = settings._config
+        # Values are already read, no second interpolation
+        self._config = configparser.ConfigParser(interpolation=None)
+        self._config["BaseSettings"] = {
+            **dict(config.items("BaseSettings", raw=True)),
+            **dict(config.items(section, raw=True)),
+        }
+        if config.has_section(self.RULES_SECTION):
+            self._config[self.RULES_SECTION] = dict(
+                config.items(self.RULES_SECTION, raw=True)
+            )
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+
+
+class SettingsSnapshot(NamedTuple):
+    """Immutable, already converted copy of the settings used to process files"""
+
+    source_dir: pathlib.Path
+    file_format: str
+    fms_format: str
+    save_xml: bool
+    save_existing_target: bool
+    number_of_days: int
+    ready_timeout: float
+    copy_mode: str
+    fsync_policy: str
+    rules: FilenameRules
+    recursive: bool
+    include_patterns: tuple
+    exclude_patterns: tuple
+
+    def handles(self, file_name):
+        """True when a filename rule applies to the downloaded file"""
+        return self.rules.find(file_name) is not None
+
+    def target_names(self, file_name, read_header=None):
+        """Target file names for a downloaded file, empty when it is ignored"""
+        return self.rules.targets(file_name, read_header)
+
+    def renames(self, file_name):
+        """True when the downloaded file is moved into its last target"""
+        suffix = pathlib.PurePath(file_name).suffix.lower()
+        if suffix == ".xml":
+            return not self.save_xml
+        if suffix == ".fms":
+            return self.fms_format == RenamerSettings.FMS_B738
+        return False
+
+    def new_filename(self, current_filename):
+        """returns target filename based on format"""
+        targets = self.target_names(current_filename + ".xml")
+        return targets[0] if targets else None
+
+    def fms_filename(self):
+        """function that returs the fms filename"""
+        return pathlib.Path(RenamerSettings.FMS_TEMPLATE)
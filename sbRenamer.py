@@ -1,28 +1,28 @@
-"""Main module, includes controller, eventhandler and main app"""
-import datetime
+"""Main module, includes controller and main app, the engine is in renamer_engine"""
+import time
+
+# Mod 24 Taken before the other imports to measure them
+_STARTED = time.perf_counter()
+
+# pylint: disable=wrong-import-position
+import argparse
 import logging
 import os
 import sys
 import threading
-import time
-import pathlib
-import shutil
 import tkinter as tk
-from collections.abc import Iterator
-from tkinter import messagebox
 from tkinter.messagebox import showerror
-from pystray import MenuItem as item
-import pystray
 
-from PIL import Image
-
-from watchdog.observers import Observer
-from watchdog.events import PatternMatchingEventHandler
 from renamer_settings_model import RenamerSettings
+from renamer_engine import RenamerService
 from RenamerViews import RenamerView, SettingView
+from startup_timer import StartupTimer
 from _version import __version__
 
 CONFIGFILENAME = "config.ini"
+ICONFILENAME = "./sbRenamer.ico"
+STARTUP_TIMER = StartupTimer(started=_STARTED)
+STARTUP_TIMER.mark("imports")
 # used python-watchdog.py from https://gist.github.com/rms1000watt
 # and http://sfriederichs.github.io/how-to/python/gui/logging/2017/12/21/Python-GUI-Logging.html
 # and mvc intro https://www.pythontutorial.net/tkinter/tkinter-mvc/
@@ -36,6 +36,32 @@ CONFIGFILENAME = "config.ini"
 # Mod 14 20231025 Add Removing old files
 # Mod 15 20231102 New filename & fms listener
 # Mod 16 20231108 Added check if source is destination
+# Mod 17          Ignore list as TimedSet, replaced by the journal in Mod 38
+# Mod 18          Debounce events per source path iso a timer per event
+# Mod 19          Wait for the file to be complete iso a fixed 2 second delay
+# Mod 20          Optional inotify close write trigger on linux
+# Mod 21          Bounded worker pool for copy and rename jobs
+# Mod 22          Optional asyncio engine
+# Mod 23          Engine moved to renamer_engine, headless daemon
+# Mod 24          Lazy pystray/PIL imports, one tray icon, startup timing
+# Mod 25          Immutable settings snapshot per job
+# Mod 26          Apply saved settings without restarting the listener
+# Mod 27          Reload config.ini when it is changed on disk
+# Mod 28          Filename rules compiled from the settings iso an if-chain
+# Mod 29          Origin and destination read from the OFP xml for filename rules
+# Mod 30          Copy with reflink, copy_file_range or hardlink when possible
+# Mod 31          Publish targets atomically, optional fsync
+# Mod 32          FileDeleter on scandir with one clock read per sweep
+# Mod 33          Periodic clean up from an index of modification times
+# Mod 34          Size and count limits for the clean up
+# Mod 35          Several watched folders, recursive with include and exclude patterns
+# Mod 36          Adaptive polling observer for network shares
+# Mod 37          Catch up on files that arrived while not monitoring
+# Mod 38          Journal of processed files iso a timed ignore list, TimedSet removed
+# Mod 39          Skip copies and renames of identical content
+# Mod 40          Metrics as Prometheus text file and optional localhost endpoint
+# Mod 41          Profiling with cProfile and tracemalloc on demand
+# Mod 42          Jobs wait on their source and target names iso their folder
 
 
 class Controller:
@@ -46,6 +72,7 @@ class Controller:
         model: RenamerSettings,
         setting_view: SettingView,
         rename_view: RenamerView,
+        profile=False,
     ):
         self.model = model
         self.setting_view = setting_view
@@ -53,11 +80,8 @@ class Controller:
         # Mod 8 Added listener prop to store listerer to activate on rename
         self.listener = None
         # self.view.set_controller=self
-        self._observer = None
-
-        self._filedeleter = FileDeleter(
-            self.model.source_dir, self.model.number_of_days
-        )
+        # Mod 23 Observer, handler and deleter live in the gui-less service
+        self._service = RenamerService(self.model, self.listener_wrap)
 
         self.model.set_callback(self.update_view)
         self.model.set_log_listener(self.update_widget)
@@ -69,11 +93,16 @@ class Controller:
             self.renamer_view.after(5000, self.renamer_view.minimize)
 
         self.create_delete_thread()
+        # Mod 40 Metrics file and endpoint, only when metrics are on
+        self._service.start_metrics()
+        # Mod 41 Profiling from the command line or the settings
+        self._service.set_profiling(profile or self.model.profile)
+        # Mod 27 Pick up changes made to the ini file by other programs
+        self._service.start_config_watcher(self.settings_reloaded)
 
     def create_delete_thread(self):
         """Creates a no deamon thread to start removing files in 10 sec"""
-        self.delete_thread = threading.Timer(10, self.start_clean)
-        self.delete_thread.start()
+        self._service.create_delete_thread()
 
     def update_model(
         self,
@@ -100,7 +129,7 @@ class Controller:
 
     def start_clean(self):
         """Start the actual deletion fot files"""
-        self._filedeleter.list_files()
+        self._service.start_clean()
 
     def switch_monitoring(self, state):
         """Alternate monitoring based on given state"""
@@ -114,28 +143,11 @@ class Controller:
 
     def start_monitoring(self):
         """Starts a new observer as deamon whith a the custom rename/delete handler"""
-
-        self._observer = Observer()
-        sourcedir = pathlib.Path(self.model.source_dir)
-        self._observer.schedule(
-            # Mod 10 Create Handler with internal listener
-            RenameXmlHandler(self.model, self.listener_wrap),
-            sourcedir,
-            recursive=False,
-        )
-        self._observer.daemon = True
-        self._observer.start()
-
-        self.model.monitoring = True
-        logging.info("Starting File System Watcher")
+        self._service.start_monitoring()
 
     def stop_monitoring(self):
         """Stops the monitoring thread"""
-
-        self._observer.stop()
-        self._observer.join()
-        self.model.monitoring = False
-        logging.info("Stopping File System Watcher")
+        self._service.stop_monitoring()
 
     def is_monitoring(self) -> bool:
         """Returns monitoring model state"""
@@ -146,16 +158,12 @@ class Controller:
     def listener_wrap(self, message, title):
         """method to call listener if set"""
         if self.listener:
+            self._service.metrics.inc("notifications")
             self.listener(message, title)
 
     def is_active_monitoring(self) -> bool:
         """Returns observer state"""
-
-        if self._observer:
-            return self._observer.is_alive()
-        # else:
-        logging.warning("Observer is no longer present")
-        return False
+        return self._service.is_active_monitoring()
 
     # 10 Set listener prop
     def set_listener(self, listener):
@@ -166,21 +174,35 @@ class Controller:
         """Save model and folluw up"""
 
         self.model.save()
-        if self._filedeleter.days != int(self.model.number_of_days):
-            # Create new instance with new settings and start it
-            self._filedeleter = FileDeleter(
-                self.model.source_dir, int(self.model.number_of_days)
-            )
-            self.create_delete_thread()
-
-        # 11 If monitoring is active ask the user if he wants to restart
-        if self.is_monitoring():
-            if messagebox.askyesno(
-                title="sbRenamer",
-                message="Restart listener to use new settings?",
-            ):
-                self.stop_monitoring()
-                self.start_monitoring()
+        # Mod 26 Applied to the running listener, no restart needed
+        self._service.apply_saved_settings()
+
+    def refresh_widgets(self):
+        """Show the model values in the settings widgets"""
+        self.setting_view.set_widgets(
+            self.model.source_dir,
+            self.model.file_format,
+            self.model.FILEFORMATS,
+            self.model.auto_start,
+            self.model.auto_hide,
+            self.model.fms_format,
+            self.model.FMS_OPTIONS,
+        )
+        self.setting_view.set_delete_widgets(
+            self.model.save_xml, self.model.number_of_days
+        )
+
+        self.setting_view.setLogWidgets(
+            self.model.log_level, self.model.LOGLEVELS, self.model.log_to_file
+        )
+
+    def settings_reloaded(self, _changed):
+        """Called from the config watcher thread, refresh on the tk thread"""
+        self.renamer_view.after(0, self.refresh_widgets)
+
+    def shutdown(self):
+        """Stop monitoring, config watcher and scheduled clean up"""
+        self._service.shutdown()
 
     def update_view(self):
         """Update View"""
@@ -191,263 +213,17 @@ class Controller:
         self.renamer_view.addLine(value)
 
 
-class FileDeleter:
-    """Object to check and delete files"""
-
-    def __init__(self, folder, days):
-        # folder is the name of the folder in which we have to perform the delete operation
-        self.folder = folder
-
-        # N is the number of days for which we have to check whether the file is older
-        # than the specified days or not
-        self.days = int(days)
-        logging.debug(
-            "Initialised new deleter for path %s and %d number of days",
-            self.folder,
-            self.days,
-        )
-
-    def list_files(self):
-        """function list all de files in self.folder and remove"""
-
-        if self.days == 0:
-            logging.info("Configured for no deletions")
-            return
-
-        logging.info("Listing files to check for deletion")
-        # loop to check all files one by one
-
-        for file in os.listdir(self.folder):
-            logging.debug("found %s", file)
-            file_2_examine = os.path.join(self.folder, file)
-            if os.path.isfile(file_2_examine):
-                logging.debug("found %s to be a file", file_2_examine)
-                if self.file_is_to_old(file_2_examine):
-                    # remove file
-                    os.remove(file_2_examine)
-                    logging.info("Deleting : %s", file_2_examine)
-
-    def file_is_to_old(self, filename):
-        """Function returns true if file is to old, modified longer than self.days ago"""
-        # temp variable to store path of the file
-
-        # get the timestamp, when the file was modified
-        timestamp_of_file_modified = os.path.getmtime(filename)
-        # convert timestamp to datetime
-        modification_date = datetime.datetime.fromtimestamp(timestamp_of_file_modified)
-        # find the number of days when the file was modified
-        number_of_days = (datetime.datetime.now() - modification_date).days
-        logging.debug("File is %d    day old", number_of_days)
-        return number_of_days > self.days
-
-
-class TimedList(list):
-    """Custom implementation of a list that removes items after a fixed delay"""
-
-    def __init__(self, ttl):
-        self.list = []
-        self._ttl = ttl
-
-    def __ttl_remove(self, list_item):
-        """Method that should only be called internally to remove item with delay"""
-        time.sleep(self._ttl)
-        self.list.remove(list_item)
-        logging.debug("Removing %s from list", list_item)
-
-    def append(self, __object) -> None:
-        self.list.append(__object)
-        logging.debug("Added item %s", __object)
-        remove_thread = threading.Thread(
-            target=self.__ttl_remove,
-            args=(__object,),
-        )
-        remove_thread.start()
-
-    def __contains__(self, __key: object) -> bool:
-        return __key in self.list
-
-    def __iter__(self) -> Iterator:
-        for list_item in self.list:
-            yield list_item
-
-
-class RenameXmlHandler(PatternMatchingEventHandler):
-    """Handler to catch newly created files and rename them"""
-
-    # Set filename pattern
-    # Mod 15
-    patterns = ["*.xml", "*.fms"]
-    DELAY_EXECUTION = 2
-    CACHE_TTL = 3
-    # Initialise fileNamesCreated, will be used to ignore the files created
-    file_names_to_ignore = TimedList(CACHE_TTL)
-
-    # 10 Added listener on construct
-    def __init__(self, model: RenamerSettings, listener):
-        PatternMatchingEventHandler.__init__(self)
-        self.model = model
-        self.listener = listener
-
-    def execute_with_delay(self, method_to_execute, *args):
-        """Default wrapper for delayed execution"""
-        threading.Timer(self.DELAY_EXECUTION, method_to_execute, args=args).start()
-
-    def on_modified(self, event):
-        logging.info("Trigger modified file: %s", (event.src_path))
-
-        newfile_path = pathlib.Path(event.src_path)
-        newfile_stem = newfile_path.stem
-
-        # Mod 15 rewrite of ignoring earlier created files
-        if (newfile_path.name in self.file_names_to_ignore) and (
-            "(1)" not in newfile_stem
-        ):
-            logging.debug(
-                "Ignoring the %s (created or processed already)", newfile_stem
-            )
-            return
-
-        self.file_names_to_ignore.append(newfile_path.name)
-        # Mod 15 Check for extention
-        if pathlib.Path(event.src_path).suffix == ".xml":
-            if self.model.save_xml:
-                self.execute_with_delay(
-                    self.copy_shortend, event, self.model.new_filename(newfile_stem)
-                )
-            else:
-                self.execute_with_delay(
-                    self.rename_shortend, event, self.model.new_filename(newfile_stem)
-                )
-
-        else:
-            # mod 15 This is a fms file
-            if self.model.fms_format == self.model.FMS_BOTH:
-                self.execute_with_delay(
-                    self.copy_shortend, event, self.model.fms_filename()
-                )
-
-            elif self.model.fms_format == self.model.FMS_B738:
-                self.execute_with_delay(
-                    self.rename_shortend, event, self.model.fms_filename()
-                )
-
-    def copy_shortend(self, event, target_filename):
-        """copy based on event source path"""
-
-        logging.debug("Start copy target %s", target_filename)
-        newfile_path = pathlib.Path(event.src_path)
-        filename = newfile_path.stem
-        # 10 Change destFile into Path, to use pathib functions
-        dest_file = pathlib.Path(newfile_path.parent / target_filename)
-
-        # mod 16
-        if self.destination_equals_source(dest_file, newfile_path):
-            return
-
-        self.file_names_to_ignore.append(dest_file.name)
-        if self.model.save_existing_target and dest_file.is_file():
-            logging.info("Destination file exits")
-            self.rename_existing_file(dest_file)
-
-        try:
-            shutil.copyfile(newfile_path, dest_file)
-            logging.info("filename: %s copied to %s", filename, dest_file.name)
-            # 10 If the listener is assigned, activate it with correct message
-            if self.listener:
-                self.listener(
-                    f"filename: {filename} copied to {dest_file.name}",
-                    "sbRenamer",
-                )
-
-        except shutil.Error as err:
-            logging.error(
-                "Unable to copy %s to %s, error: %s", filename, dest_file, err
-            )
-
-    # Mod 16
-    def destination_equals_source(self, dest_file, source_file):
-        """Check if files are the same (and existing)"""
-        logging.debug("check if equal")
-        if dest_file.is_file():
-            return_value = dest_file.name == source_file.name
-        else:
-            return_value = False
-        logging.debug("Equal check returns %s", return_value)
-        return return_value
-
-    def rename_shortend(self, event, target_filename):
-        """Handle file created event by renaming the file that was created"""
-        # This method needs to move to the Renamer model??
-        logging.debug("Start rename")
-        new_file_path = pathlib.Path(event.src_path)
-        filename = new_file_path.stem
-        # 10 Change destFile into Path, to use pathib functions
-        dest_file = pathlib.Path(new_file_path.parent / target_filename)
-
-        # Mod 16
-        if self.destination_equals_source(dest_file, new_file_path):
-            return
-
-        # keep the new file to be created to check new event
-        self.file_names_to_ignore.append(dest_file.name)
-        if dest_file.is_file():
-            self.handle_existing_destination(dest_file)
-
-        try:
-            new_file_path.rename(dest_file)
-            logging.info("filename: %s renamed to %s", filename, dest_file.name)
-            # 10 If the listener is assigned, activate it with correct message
-            if self.listener:
-                self.listener(
-                    f"filename: {filename} renamed to {dest_file.name}",
-                    "sbRenamer",
-                )
-
-        except OSError as err:
-            logging.error(
-                "Unable to rename %s to %s, error: %s", filename, dest_file, err
-            )
-
-    def handle_existing_destination(self, dest_file):
-        """Removes or renames exisiting file"""
-        logging.debug("Destination file exits")
-        if self.model.save_existing_target:
-            logging.debug("Renaming Existing Destination")
-            self.rename_existing_file(dest_file)
-        else:
-            logging.debug("Removing Existing Destination")
-            os.remove(dest_file)
-
-    def rename_existing_file(self, file_to_rename):
-        """renames file to samename with datetime"""
-
-        logging.debug("Renaming file to datetime version")
-        backup_file = file_to_rename.parent / pathlib.Path(
-            file_to_rename.stem
-            + "_"
-            + time.strftime("%Y%m%d%H%M%S")
-            + file_to_rename.suffix
-        )
-        try:
-            self.file_names_to_ignore.append(backup_file.name)
-            file_to_rename.rename(backup_file)
-        except OSError as error:
-            logging.error("problem with renaming existing file")
-            logging.error(error)
-            sys.exit(1)
-        logging.info("Renamed existing file to %s", backup_file.name)
-
-
 class MainApp(tk.Tk):
     """Main tk window"""
 
-    def __init__(self):
+    def __init__(self, startup_timer=STARTUP_TIMER, profile=False):
+        self._startup_timer = startup_timer
         super().__init__()
         self.geometry("620x600")
         self.resizable(width=False, height=False)
 
         self.title("SimBrief Renamer by ChezHJ")
-        self.iconbitmap("./sbRenamer.ico")
+        self.iconbitmap(ICONFILENAME)
         # if we want parent frames to resize to there master, we need to update the app
         self.update()
 
@@ -456,27 +232,15 @@ class MainApp(tk.Tk):
 
         self._renamer_view = RenamerView(self)
         self._renamer_view.grid(column=0, row=1, padx=5, pady=5, ipadx=5)
+        self._startup_timer.mark("tk construction")
 
         self._config = RenamerSettings(CONFIGFILENAME)
-        controller = Controller(self._config, self._settings, self._renamer_view)
-
-        # should move to controller?
-        self._settings.set_widgets(
-            self._config.source_dir,
-            self._config.file_format,
-            self._config.FILEFORMATS,
-            self._config.auto_start,
-            self._config.auto_hide,
-            self._config.fms_format,
-            self._config.FMS_OPTIONS,
-        )
-        self._settings.set_delete_widgets(
-            self._config.save_xml, self._config.number_of_days
+        self._startup_timer.mark("config load")
+        controller = Controller(
+            self._config, self._settings, self._renamer_view, profile
         )
 
-        self._settings.setLogWidgets(
-            self._config.log_level, self._config.LOGLEVELS, self._config.log_to_file
-        )
+        controller.refresh_widgets()
 
         self._controller = controller
         self._settings.set_controller(controller)
@@ -487,6 +251,13 @@ class MainApp(tk.Tk):
         self.hidden = False
         self.icon = None
         logging.info("Succesfully initialised version %s", __version__)
+        self._startup_timer.mark("controller and widgets")
+        self.after_idle(self._first_paint)
+
+    def _first_paint(self):
+        """Runs once the main loop is idle for the first time"""
+        self._startup_timer.mark("first paint")
+        self._startup_timer.report()
 
     def _resize_handler(self, event):
         minimize_event = False
@@ -510,10 +281,20 @@ class MainApp(tk.Tk):
             return
         self.hidden = True
         self.withdraw()
-        icon_image = Image.open("./sbRenamer.ico")
+        # Mod 24 The tray icon is created once and shown or hidden after that
+        if self.icon:
+            self.icon.visible = True
+            return
+
+        # pylint: disable=import-outside-toplevel
+        import pystray
+        from PIL import Image
+
+        icon_image = Image.open(ICONFILENAME)
+        icon_image.load()
         icon_menu = (
-            item("Quit", self.quit_window),
-            item("Show", default=True, action=self.show_window),
+            pystray.MenuItem("Quit", self.quit_window),
+            pystray.MenuItem("Show", default=True, action=self.show_window),
         )
 
         self.icon = pystray.Icon("name", icon_image, "Simbrief Renamer", icon_menu)
@@ -528,7 +309,7 @@ class MainApp(tk.Tk):
 
     def show_window(self):
         """Unhide from systray"""
-        self.icon.stop()
+        self.icon.visible = False
         self.hidden = False
         self.deiconify()
 
@@ -536,18 +317,39 @@ class MainApp(tk.Tk):
         """Safe close, stop monitoring first"""
         if self._controller.is_active_monitoring():
             logging.info("Stopping monitoring first")
-            self._controller.stop_monitoring()
+        self._controller.shutdown()
+        if self.icon:
+            self.icon.stop()
+            self.icon = None
         self.destroy()
 
     def quit_window(self):
         """Quit function for icon menu"""
-        self.icon.stop()
         self.close()
 
 
+def parse_args(argv=None):
+    """Parse the command line of the gui"""
+    parser = argparse.ArgumentParser(prog="sbRenamer")
+    parser.add_argument(
+        "--startup-timing",
+        action="store_true",
+        default=bool(os.environ.get("SBRENAMER_STARTUP_TIMING")),
+        help="log the duration of each startup phase",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile the handler and clean up, files are written next to log.txt",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    ARGS = parse_args()
+    STARTUP_TIMER.enabled = ARGS.startup_timing
     try:
-        app = MainApp()
+        app = MainApp(profile=ARGS.profile)
     except FileNotFoundError as e:
         showerror("Error", e.filename + "\n" + e.strerror)
         sys.exit(1)
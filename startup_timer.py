@@ -0,0 +1,37 @@
+"""Module to measure how long the phases of application startup take"""
+import logging
+import time
+
+
+class StartupTimer:
+    """Collects named phases of startup and logs their duration once"""
+
+    def __init__(self, enabled=False, started=None):
+        self.enabled = enabled
+        self._started = time.perf_counter() if started is None else started
+        self._last = self._started
+        self._phases = []
+
+    def mark(self, phase):
+        """Close the current phase under the given name"""
+        now = time.perf_counter()
+        self._phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def phases(self):
+        """List of (phase, seconds) in the order they were marked"""
+        return list(self._phases)
+
+    @property
+    def total(self):
+        """Seconds from start to the last mark"""
+        return self._last - self._started
+
+    def report(self):
+        """Log all phases, only when timing is enabled"""
+        if not self.enabled:
+            return
+        for phase, duration in self._phases:
+            logging.info("Startup %s: %.1f ms", phase, duration * 1000)
+        logging.info("Startup total: %.1f ms", self.total * 1000)
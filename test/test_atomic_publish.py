@@ -0,0 +1,56 @@
+"""Unit tests for atomic_publish Module"""
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from atomic_publish import FSYNC_DIRECTORY, keep_copy, publish, replace
+
+
+class TestAtomicPublish(unittest.TestCase):
+    """test class for publishing targets"""
+
+    def setUp(self):
+        self.directory = pathlib.Path(tempfile.mkdtemp())
+        self.target = self.directory / "b738x.xml"
+        self.target.write_text("old")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_publish_replaces_target(self):
+        result = publish(
+            self.target, lambda path: path.write_text("new"), FSYNC_DIRECTORY
+        )
+        self.assertEqual(result, 3)
+        self.assertEqual(self.target.read_text(), "new")
+        self.assertEqual(os.listdir(self.directory), ["b738x.xml"])
+
+    def test_failed_write_keeps_target(self):
+        def broken(path):
+            path.write_text("partial")
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            publish(self.target, broken)
+        self.assertEqual(self.target.read_text(), "old")
+        self.assertEqual(os.listdir(self.directory), ["b738x.xml"])
+
+    def test_replace(self):
+        source = self.directory / "EHAMLFPG.xml"
+        source.write_text("new")
+        replace(source, self.target, FSYNC_DIRECTORY)
+        self.assertEqual(self.target.read_text(), "new")
+        self.assertFalse(source.exists())
+
+    def test_keep_copy_leaves_target(self):
+        backup = self.directory / "b738x_1.xml"
+        keep_copy(self.target, backup)
+        replace_source = self.directory / "EHAMLFPG.xml"
+        replace_source.write_text("new")
+        replace(replace_source, self.target)
+        self.assertEqual(backup.read_text(), "old")
+        self.assertEqual(self.target.read_text(), "new")
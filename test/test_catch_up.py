@@ -0,0 +1,53 @@
+"""Unit tests for catch_up Module"""
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from catch_up import ProcessedMarker, find_new_files
+
+
+class TestCatchUp(unittest.TestCase):
+    """test class for the scan and the marker of processed files"""
+
+    def setUp(self):
+        self.directory = pathlib.Path(tempfile.mkdtemp())
+        (self.directory / "sub").mkdir()
+        self.create("old.xml", 100)
+        self.create("EHAMLFPG.xml", 300)
+        self.create("EHAMLFPG.fms", 200)
+        self.create("notes.txt", 400)
+        self.create(os.path.join("sub", "KJFKKBOS.xml"), 500)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create(self, name, mtime):
+        path = self.directory / name
+        path.write_text(name)
+        os.utime(path, ns=(mtime * 10**9, mtime * 10**9))
+
+    def names(self, found):
+        return [os.path.basename(path) for _, path in found]
+
+    def test_find_new_files_oldest_first(self):
+        found = find_new_files(
+            self.directory,
+            150 * 10**9,
+            accepts=lambda path: not path.endswith(".txt"),
+        )
+        self.assertEqual(self.names(found), ["EHAMLFPG.fms", "EHAMLFPG.xml"])
+        found = find_new_files(self.directory, recursive=True)
+        self.assertEqual(len(found), 5)
+        self.assertEqual(self.names(found)[-1], "KJFKKBOS.xml")
+
+    def test_marker_is_saved_and_only_moves_forward(self):
+        marker = ProcessedMarker(self.directory / "config.marker")
+        self.assertIsNone(marker.get(self.directory))
+        self.assertTrue(marker.update(self.directory, 300 * 10**9))
+        self.assertFalse(marker.update(self.directory, 200 * 10**9))
+        reloaded = ProcessedMarker(self.directory / "config.marker")
+        self.assertEqual(reloaded.get(str(self.directory) + os.sep), 300 * 10**9)
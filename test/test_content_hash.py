@@ -0,0 +1,52 @@
+"""Unit tests for content_hash Module"""
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from content_hash import HashCache, file_digest
+
+
+class TestHashCache(unittest.TestCase):
+    """test class for comparing file content"""
+
+    def setUp(self):
+        self.directory = pathlib.Path(tempfile.mkdtemp())
+        self.source = self.directory / "EHAMLFPG.xml"
+        self.target = self.directory / "b738x.xml"
+        self.source.write_text("<OFP>plan</OFP>")
+        self.target.write_text("<OFP>plan</OFP>")
+        self.hashed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def digest(self, path):
+        self.hashed.append(pathlib.Path(path).name)
+        return file_digest(path)
+
+    def test_same_content_hashes_target_once(self):
+        cache = HashCache(digest=self.digest)
+        self.assertTrue(cache.same_content(self.source, self.target))
+        self.assertTrue(cache.same_content(self.source, self.target))
+        self.assertEqual(self.hashed, ["EHAMLFPG.xml", "b738x.xml"])
+
+    def test_different_size_is_not_hashed(self):
+        cache = HashCache(digest=self.digest)
+        self.target.write_text("<OFP>other plan</OFP>")
+        self.assertFalse(cache.same_content(self.source, self.target))
+        self.assertEqual(self.hashed, [])
+
+    def test_same_size_other_content(self):
+        self.target.write_text("<OFP>nalp</OFP>")
+        self.assertFalse(HashCache().same_content(self.source, self.target))
+
+    def test_missing_and_empty_files(self):
+        self.assertFalse(
+            HashCache().same_content(self.source, self.directory / "missing.xml")
+        )
+        empty = self.directory / "empty.xml"
+        empty.write_text("")
+        self.assertEqual(file_digest(empty), file_digest(empty))
@@ -0,0 +1,85 @@
+"""Unit tests for copy_modes Module"""
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# pylint: disable=missing-function-docstring
+
+import copy_modes
+from copy_modes import FileCopier
+
+
+class TestFileCopier(unittest.TestCase):
+    """test class for copy modes and detection"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "EHAMLFPG.xml")
+        self.target = os.path.join(self.directory, "b738x.xml")
+        with open(self.source, "wb") as source:
+            source.write(b"<OFP>" + b"x" * 100000 + b"</OFP>")
+        self.copier = FileCopier()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_copied(self):
+        with open(self.source, "rb") as source, open(self.target, "rb") as target:
+            self.assertEqual(source.read(), target.read())
+
+    def test_plain_copy(self):
+        self.assertEqual(self.copier.copy(self.source, self.target, "copy"), "copy")
+        self.assert_copied()
+
+    def test_auto_copies(self):
+        mode = self.copier.copy(self.source, self.target)
+        self.assertIn(mode, copy_modes.AUTO_ORDER)
+        self.assert_copied()
+
+    @unittest.skipUnless(hasattr(os, "copy_file_range"), "no copy_file_range")
+    def test_copy_file_range(self):
+        copy_modes.copy_range(self.source, self.target)
+        self.assert_copied()
+
+    def test_short_kernel_copy_falls_back(self):
+        def copies_nothing(src_fd, dst_fd, count):
+            return 0
+
+        with patch.object(os, "copy_file_range", copies_nothing, create=True):
+            with self.assertRaises(copy_modes.CopyNotSupported):
+                copy_modes.copy_range(self.source, self.target)
+            self.assertEqual(
+                self.copier.copy(self.source, self.target, "copy_file_range"), "copy"
+            )
+        self.assert_copied()
+
+    @unittest.skipUnless(hasattr(os, "link"), "no hardlinks")
+    def test_hardlink_replaces_target(self):
+        with open(self.target, "w", encoding="utf-8") as target:
+            target.write("old")
+        self.copier.copy(self.source, self.target, "hardlink")
+        self.assertTrue(os.path.samefile(self.source, self.target))
+
+    def test_unsupported_mode_falls_back_once(self):
+        calls = []
+
+        def no_reflink(source, target):
+            calls.append(target)
+            raise OSError(errno.EOPNOTSUPP, "no reflink")
+
+        with patch.dict(copy_modes.COPY_FUNCTIONS, {"reflink": no_reflink}):
+            self.assertEqual(
+                self.copier.copy(self.source, self.target, "reflink"), "copy"
+            )
+            self.assertEqual(
+                self.copier.copy(self.source, self.target, "reflink"), "copy"
+            )
+        self.assertEqual(len(calls), 1)
+        self.assert_copied()
+
+    def test_real_errors_are_raised(self):
+        with self.assertRaises(FileNotFoundError):
+            self.copier.copy(self.source, os.path.join(self.directory, "x", "y.xml"))
@@ -0,0 +1,53 @@
+"""Unit tests for DebounceScheduler Module"""
+import threading
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from debounce_scheduler import DebounceScheduler
+
+
+class TestDebounceScheduler(unittest.TestCase):
+    """main test class for merging and executing jobs"""
+
+    def setUp(self):
+        self.scheduler = DebounceScheduler()
+        self.calls = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+        self.scheduler.join(2)
+
+    def record(self, value):
+        self.calls.append(value)
+        self.done.set()
+
+    def test_job_is_executed(self):
+        self.scheduler.schedule("a.xml", 0.01, self.record, "a")
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.calls, ["a"])
+
+    def test_same_key_is_merged(self):
+        self.assertFalse(self.scheduler.schedule("a.xml", 0.2, self.record, 1))
+        self.assertTrue(self.scheduler.schedule("a.xml", 0.2, self.record, 2))
+        self.assertEqual(self.scheduler.pending(), 1)
+        self.assertTrue(self.done.wait(2))
+        self.scheduler.stop()
+        self.scheduler.join(2)
+        self.assertEqual(self.calls, [2])
+
+    def test_touch_without_pending_job(self):
+        self.assertFalse(self.scheduler.touch("a.xml", 0.1))
+
+    def test_touch_pending_job(self):
+        self.scheduler.schedule("a.xml", 0.2, self.record, "a")
+        self.assertTrue(self.scheduler.touch("a.xml", 0.2))
+        self.assertTrue(self.scheduler.is_pending("a.xml"))
+
+    def test_pending_jobs_run_after_stop(self):
+        self.scheduler.schedule("a.xml", 0.05, self.record, "a")
+        self.scheduler.stop()
+        self.scheduler.join(2)
+        self.assertEqual(self.calls, ["a"])
+        self.assertFalse(self.scheduler.schedule("b.xml", 0.05, self.record, "b"))
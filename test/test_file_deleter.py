@@ -0,0 +1,136 @@
+"""Unit tests for FileDeleter Module"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from file_deleter import (
+    SECONDS_PER_DAY,
+    FileDeleter,
+    MtimeIndex,
+    parse_file_limits,
+    parse_size,
+)
+
+
+class TestFileDeleter(unittest.TestCase):
+    """test class for sweeping old files"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        now = time.time()
+        for number in range(10):
+            self.create(f"old{number}.xml", now - 3 * SECONDS_PER_DAY)
+        self.create("young.xml", now - SECONDS_PER_DAY - 60)
+        self.create("new.fms", now)
+        os.mkdir(os.path.join(self.directory, "archive"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create(self, name, mtime):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(name)
+        os.utime(path, (mtime, mtime))
+
+    def test_old_files_are_deleted(self):
+        stats = FileDeleter(self.directory, 1).list_files()
+        self.assertEqual(stats["scanned"], 12)
+        self.assertEqual(stats["deleted"], 10)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), ["archive", "new.fms", "young.xml"]
+        )
+
+    def test_batched_deletes(self):
+        stats = FileDeleter(self.directory, 1, batch_size=3).list_files()
+        self.assertEqual(stats["deleted"], 10)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+    def test_zero_days_deletes_nothing(self):
+        self.assertIsNone(FileDeleter(self.directory, 0).list_files())
+        self.assertEqual(len(os.listdir(self.directory)), 13)
+
+    def test_file_is_to_old(self):
+        deleter = FileDeleter(self.directory, 1)
+        self.assertTrue(
+            deleter.file_is_to_old(os.path.join(self.directory, "old0.xml"))
+        )
+        self.assertFalse(
+            deleter.file_is_to_old(os.path.join(self.directory, "young.xml"))
+        )
+
+    def test_sweep_only_checks_expired_files(self):
+        deleter = FileDeleter(self.directory, 1)
+        deleter.list_files()
+        self.assertEqual(len(deleter.index), 2)
+        young = os.path.join(self.directory, "young.xml")
+        self.create("young.xml", time.time() - 3 * SECONDS_PER_DAY)
+        self.create("later.xml", time.time() - 3 * SECONDS_PER_DAY)
+        deleter.file_changed(young)
+        deleter.file_changed(os.path.join(self.directory, "later.xml"))
+        stats = deleter.sweep()
+        self.assertEqual(
+            stats,
+            {"scanned": 2, "deleted": 2, "evicted": 0, "seconds": stats["seconds"]},
+        )
+        self.assertEqual(sorted(os.listdir(self.directory)), ["archive", "new.fms"])
+
+    def test_sweep_keeps_files_changed_without_event(self):
+        deleter = FileDeleter(self.directory, 1)
+        deleter.list_files()
+        young = os.path.join(self.directory, "young.xml")
+        deleter.index.update(young, 0)
+        self.assertEqual(deleter.sweep()["deleted"], 0)
+        self.assertIn(young, deleter.index)
+
+    def test_count_and_size_limits(self):
+        deleter = FileDeleter(self.directory, 0, max_bytes=40, max_files={"old*": 4})
+        stats = deleter.list_files()
+        # 12 files of 7 to 9 bytes, old ones go first
+        self.assertEqual(stats["evicted"], 7)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ["archive", "new.fms", "old7.xml", "old8.xml", "old9.xml", "young.xml"],
+        )
+        self.assertFalse(deleter.over_limits())
+        self.create("old10.xml", time.time())
+        deleter.file_changed(os.path.join(self.directory, "old10.xml"))
+        self.assertTrue(deleter.over_limits())
+        self.assertEqual(deleter.enforce_limits(), 2)
+
+
+class TestMtimeIndex(unittest.TestCase):
+    """test class for the index of modification times"""
+
+    def test_oldest_first_and_stale_entries_skipped(self):
+        index = MtimeIndex()
+        index.update("a.xml", 10)
+        index.update("b.xml", 5)
+        index.update("a.xml", 50)
+        index.update("c.xml", 1)
+        index.remove("c.xml")
+        self.assertEqual(index.pop_expired(20), ["b.xml"])
+        self.assertEqual(index.pop_expired(100), ["a.xml"])
+        self.assertEqual(len(index), 0)
+
+
+class TestParseLimits(unittest.TestCase):
+    """test class for the limit settings"""
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("2GB"), 2 * 1024**3)
+        self.assertEqual(parse_size("1.5 kb"), 1536)
+        self.assertEqual(parse_size("100"), 100)
+        self.assertEqual(parse_size(""), 0)
+
+    def test_parse_file_limits(self):
+        self.assertEqual(
+            parse_file_limits("*.xml=200; b738x_*.xml = 50"),
+            {"*.xml": 200, "b738x_*.xml": 50},
+        )
+        with self.assertRaises(ValueError):
+            parse_file_limits("*.xml")
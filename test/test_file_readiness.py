@@ -0,0 +1,52 @@
+"""Unit tests for file_readiness Module"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from file_readiness import wait_until_stable
+
+
+class TestWaitUntilStable(unittest.TestCase):
+    """main test class for the readiness poll"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "EHAMLFPG.xml")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_complete_file_is_ready_fast(self):
+        with open(self.path, "w", encoding="utf-8") as ofp:
+            ofp.write("<OFP/>")
+        start = time.monotonic()
+        self.assertTrue(wait_until_stable(self.path, 5))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_waits_for_writer(self):
+        def writer():
+            with open(self.path, "a", encoding="utf-8") as ofp:
+                for _ in range(50):
+                    ofp.write("<OFP/>")
+                    ofp.flush()
+                    time.sleep(0.002)
+            done.set()
+
+        with open(self.path, "w", encoding="utf-8") as ofp:
+            ofp.write("<OFP>")
+        done = threading.Event()
+        threading.Thread(target=writer).start()
+        self.assertTrue(wait_until_stable(self.path, 5))
+        self.assertTrue(done.is_set())
+
+    def test_timeout_on_empty_file(self):
+        open(self.path, "w", encoding="utf-8").close()
+        self.assertFalse(wait_until_stable(self.path, 0.05))
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            wait_until_stable(self.path, 1)
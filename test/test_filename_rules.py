@@ -0,0 +1,109 @@
+"""Unit tests for filename_rules Module"""
+import pathlib
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from filename_rules import FilenameRule, FilenameRules, RuleError, Template
+
+
+class TestTemplate(unittest.TestCase):
+    """test class for rendering templates"""
+
+    def test_literal(self):
+        self.assertEqual(Template("b738x.xml").render({}), "b738x.xml")
+
+    def test_field_and_slice(self):
+        template = Template("{stem[:8]}01{suffix}")
+        self.assertEqual(
+            template.render({"stem": "EHAMLFPG_1234", "suffix": ".xml"}),
+            "EHAMLFPG01.xml",
+        )
+
+    def test_missing_field(self):
+        with self.assertRaises(KeyError):
+            Template("{orig}.xml").render({})
+
+    def test_no_directories(self):
+        with self.assertRaises(RuleError):
+            Template("../b738x.xml")
+
+    def test_values_stay_in_the_folder(self):
+        template = Template("{orig}{dest}.xml")
+        for orig in ("../../etc", "C:", "..\\EHAM", "/EHAM"):
+            with self.assertRaises(RuleError):
+                template.render({"orig": orig, "dest": "LFPG"})
+        with self.assertRaises(RuleError):
+            Template("{orig}").render({"orig": ".."})
+
+
+class TestFilenameRules(unittest.TestCase):
+    """test class for matching rules in order"""
+
+    def setUp(self):
+        self.rules = FilenameRules(
+            [
+                FilenameRule.parse(
+                    "numbered",
+                    r"re:^(?P<orig>[A-Z]{4})[A-Z]{4}_(?P<nr>\d+)\.xml$ => {orig}{nr}.xml",
+                ),
+                FilenameRule.parse("pair", "EHAM*.xml => {dest}.xml; b738x.xml"),
+                FilenameRule("file_format", "*.xml", ["{stem[:8]}.xml"]),
+                FilenameRule("fms_format", "*.fms", ["b738x.fms"]),
+            ]
+        )
+
+    def test_regex_groups(self):
+        self.assertEqual(
+            self.rules.targets("EHAMLFPG_12.xml"), (pathlib.Path("EHAM12.xml"),)
+        )
+
+    def test_several_targets(self):
+        self.assertEqual(
+            self.rules.targets("EHAMLFPG.xml"),
+            (pathlib.Path("LFPG.xml"), pathlib.Path("b738x.xml")),
+        )
+
+    def test_fallback_rule(self):
+        self.assertEqual(
+            self.rules.targets("KJFKKBOS.XML"), (pathlib.Path("KJFKKBOS.xml"),)
+        )
+
+    def test_suffix_lookup(self):
+        self.assertEqual(
+            self.rules.targets("EHAMLFPG.fms"), (pathlib.Path("b738x.fms"),)
+        )
+        self.assertEqual(len(self.rules.candidates(".fms")), 2)
+
+    def test_no_rule(self):
+        self.assertEqual(self.rules.targets("EHAMLFPG.txt"), ())
+
+    def test_invalid_definition(self):
+        with self.assertRaises(RuleError):
+            FilenameRule.parse("broken", "*.xml b738x.xml")
+        with self.assertRaises(RuleError):
+            FilenameRule.parse("regex", "re:([ => b738x.xml")
+
+    def test_route_from_header(self):
+        rule = FilenameRule.parse("route", "*.xml => {orig}{dest}.xml")
+        self.assertTrue(rule.needs_header)
+        values = rule.match("ofp_123.xml", lambda: {"orig": "EHAM", "dest": "LFPG"})
+        self.assertEqual(
+            rule.targets("ofp_123.xml", values), (pathlib.Path("EHAMLFPG.xml"),)
+        )
+
+    def test_invalid_name_from_header_is_skipped(self):
+        rule = FilenameRule.parse("route", "*.xml => {orig}{dest}.xml; b738x.xml")
+        values = rule.match("ofp_123.xml", lambda: {"orig": "../..", "dest": "LFPG"})
+        self.assertEqual(
+            rule.targets("ofp_123.xml", values), (pathlib.Path("b738x.xml"),)
+        )
+
+    def test_header_only_read_when_needed(self):
+        def read_header():
+            raise AssertionError("header read")
+
+        self.assertEqual(
+            self.rules.targets("EHAMLFPG.fms", read_header),
+            (pathlib.Path("b738x.fms"),),
+        )
@@ -0,0 +1,54 @@
+"""Unit tests for metrics Module"""
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from metrics import NULL_METRICS, Metrics, MetricsExporter
+
+
+class TestMetrics(unittest.TestCase):
+    """test class for counters, histograms and the text export"""
+
+    def test_render_prometheus_text(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.inc("files_copied")
+        metrics.inc("files_copied", 2)
+        metrics.inc("errors", stage="copy")
+        metrics.observe("stage_seconds", 0.05, stage="copy")
+        metrics.observe("stage_seconds", 0.5, stage="copy")
+        metrics.observe("stage_seconds", 5, stage="copy")
+        metrics.gauge("pending_jobs", lambda: 4)
+        lines = metrics.render().splitlines()
+        self.assertIn("sbrenamer_files_copied_total 3", lines)
+        self.assertIn("sbrenamer_files_renamed_total 0", lines)
+        self.assertIn('sbrenamer_errors_total{stage="copy"} 1', lines)
+        self.assertIn('sbrenamer_stage_seconds_bucket{stage="copy",le="0.1"} 1', lines)
+        self.assertIn('sbrenamer_stage_seconds_bucket{stage="copy",le="1.0"} 2', lines)
+        self.assertIn('sbrenamer_stage_seconds_bucket{stage="copy",le="+Inf"} 3', lines)
+        self.assertIn('sbrenamer_stage_seconds_count{stage="copy"} 3', lines)
+        self.assertIn("# TYPE sbrenamer_pending_jobs gauge", lines)
+        self.assertIn("sbrenamer_pending_jobs 4", lines)
+
+    def test_null_metrics(self):
+        NULL_METRICS.inc("files_copied")
+        NULL_METRICS.observe("stage_seconds", 1, stage="copy")
+        self.assertEqual(NULL_METRICS.value("files_copied"), 0)
+        self.assertEqual(NULL_METRICS.render(), "")
+
+    def test_exporter_writes_file(self):
+        directory = pathlib.Path(tempfile.mkdtemp())
+        try:
+            metrics = Metrics()
+            metrics.inc("backups")
+            exporter = MetricsExporter(metrics, directory / "metrics.prom", 60)
+            exporter.start()
+            exporter.stop()
+            self.assertIn(
+                "sbrenamer_backups_total 1",
+                (directory / "metrics.prom").read_text().splitlines(),
+            )
+        finally:
+            shutil.rmtree(directory)
@@ -1,4 +1,8 @@
 """Unit tests for RenamerSettings Module"""
+import os
+import pathlib
+import shutil
+import tempfile
 import unittest
 from unittest.mock import Mock, mock_open, patch
 
@@ -97,3 +101,124 @@ class TestRenamerSettings(unittest.TestCase):
             )
             self.assertFalse(rsm.dirty)
             mock_write.assert_called_once_with(mock_file_handle)
+
+    def test_default_ready_timeout(self):
+        rsm = RenamerSettings("test/empty_config.ini")
+        self.assertEqual(rsm.ready_timeout, 10.0)
+
+    def test_default_observer_backend(self):
+        rsm = RenamerSettings("test/empty_config.ini")
+        self.assertEqual(rsm.observer_backend, rsm.OBSERVER_NATIVE)
+
+    def test_default_worker_pool_settings(self):
+        rsm = RenamerSettings("test/empty_config.ini")
+        self.assertEqual(rsm.worker_count, 2)
+        self.assertEqual(rsm.queue_size, 100)
+        self.assertEqual(rsm.queue_overflow, "block")
+
+    def test_default_engine(self):
+        rsm = RenamerSettings("test/empty_config.ini")
+        self.assertEqual(rsm.engine, rsm.ENGINE_THREADS)
+
+    def test_snapshot_has_converted_values(self):
+        rsm = RenamerSettings("test/empty_config.ini")
+        snapshot = rsm.snapshot
+        self.assertIs(snapshot.save_xml, True)
+        self.assertEqual(snapshot.number_of_days, 0)
+        self.assertIs(rsm.snapshot, snapshot)
+
+    def test_snapshot_is_replaced_on_change(self):
+        rsm = RenamerSettings("test/empty_config.ini")
+        rsm.file_format = rsm.B738_FORMAT
+        old_snapshot = rsm.snapshot
+        rsm.file_format = rsm.ZERO_FORMAT
+        self.assertEqual(old_snapshot.file_format, rsm.B738_FORMAT)
+        self.assertEqual(rsm.snapshot.file_format, rsm.ZERO_FORMAT)
+        self.assertEqual(str(rsm.new_filename("EHAMLFPG_1234")), "EHAMLFPG01.xml")
+        with self.assertRaises(AttributeError):
+            old_snapshot.file_format = rsm.SHORT_FORMAT
+
+    def test_icao_formats_use_the_route(self):
+        rsm = RenamerSettings("test/empty_config.ini")
+        route = {"orig": "EHAM", "dest": "LFPG"}
+        rsm.file_format = rsm.SHORT_FORMAT
+        self.assertEqual(
+            rsm.snapshot.target_names("ofp_1234.xml", lambda: route),
+            (pathlib.Path("EHAMLFPG.xml"),),
+        )
+        rsm.file_format = rsm.ZERO_FORMAT
+        self.assertEqual(
+            rsm.snapshot.target_names("ofp_1234.xml", lambda: route),
+            (pathlib.Path("EHAMLFPG01.xml"),),
+        )
+        self.assertEqual(rsm.snapshot.target_names("ofp_1234.xml", dict), ())
+
+
+class TestRenamerSettingsReload(unittest.TestCase):
+    """tests for reloading a changed ini file"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ini_file = os.path.join(self.directory, "config.ini")
+        shutil.copyfile("test/empty_config.ini", self.ini_file)
+        self.rsm = RenamerSettings(self.ini_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_ini(self, content):
+        with open(self.ini_file, "w", encoding="utf-8") as ini_file:
+            ini_file.write(content)
+        # make sure the modification time differs on coarse file systems
+        stat = os.stat(self.ini_file)
+        os.utime(self.ini_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_unchanged_file_is_not_reloaded(self):
+        self.assertEqual(self.rsm.reload(), [])
+
+    def test_only_changed_values_are_reported(self):
+        self.write_ini(
+            "[BaseSettings]\nsource_dir = N:\\dir\\source_dir\n"
+            "file_format = ICAOICOA01.xml\n"
+        )
+        self.assertEqual(self.rsm.reload(), ["file_format"])
+        self.assertEqual(self.rsm.file_format, self.rsm.ZERO_FORMAT)
+        self.assertEqual(self.rsm.snapshot.file_format, self.rsm.ZERO_FORMAT)
+        self.assertFalse(self.rsm.dirty)
+
+    def test_removed_value_falls_back_to_default(self):
+        self.write_ini("[BaseSettings]\n")
+        self.assertEqual(self.rsm.reload(), ["source_dir"])
+        self.assertEqual(str(self.rsm.source_dir), ".")
+
+    def test_invalid_file_is_ignored(self):
+        self.write_ini("no section here")
+        self.assertEqual(self.rsm.reload(), [])
+        self.assertEqual(str(self.rsm.source_dir), r"N:\dir\source_dir")
+
+    def test_filename_rules_are_reloaded(self):
+        self.write_ini(
+            "[BaseSettings]\nsource_dir = N:\\dir\\source_dir\n"
+            "[FilenameRules]\npair = *.xml => {orig}.xml; b738x.xml\n"
+        )
+        self.assertEqual(self.rsm.reload(), ["FilenameRules"])
+        self.assertEqual(
+            self.rsm.snapshot.target_names("EHAMLFPG.xml"),
+            (pathlib.Path("EHAM.xml"), pathlib.Path("b738x.xml")),
+        )
+
+    def test_watch_roots(self):
+        self.write_ini(
+            "[BaseSettings]\nsource_dir = N:\\dir\\source_dir\nsave_xml = False\n"
+            "[Watch:second]\nsource_dir = N:\\other\nrecursive = True\n"
+            "include = *.xml\n"
+            "[Watch:same]\nsource_dir = N:\\dir\\source_dir\n"
+        )
+        self.rsm.reload()
+        main, second = [root.snapshot for root in self.rsm.watch_roots()]
+        self.assertIs(main.recursive, False)
+        self.assertEqual(main.include_patterns, ("*.xml", "*.fms"))
+        self.assertEqual(str(second.source_dir), r"N:\other")
+        self.assertIs(second.recursive, True)
+        self.assertIs(second.save_xml, False)
+        self.assertEqual(second.include_patterns, ("*.xml",))
@@ -0,0 +1,124 @@
+"""Unit tests for polling_observer Module"""
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# pylint: disable=missing-function-docstring
+
+from watchdog.events import (
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileMovedEvent,
+)
+from watchdog.observers.api import ObservedWatch
+
+import polling_observer
+from polling_observer import MAX_INTERVAL, MIN_INTERVAL, AdaptivePollingEmitter
+
+
+class TestAdaptivePollingEmitter(unittest.TestCase):
+    """test class for the polling emitter, polled by hand"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.write("old.xml", "old")
+        self.write("notes.txt", "notes")
+        self.events = queue.Queue()
+        self.now = 0.0
+        self.emitter = AdaptivePollingEmitter(
+            self.events,
+            ObservedWatch(self.directory, recursive=True),
+            clock=lambda: self.now,
+        )
+        self.emitter.poll(emit=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, text):
+        with open(self.path(name), "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def polled(self):
+        self.now += 1
+        self.emitter.poll()
+        events = []
+        while not self.events.empty():
+            events.append(self.events.get()[0])
+        return events
+
+    def test_no_changes_no_events(self):
+        self.assertEqual(self.polled(), [])
+
+    def test_created_modified_moved_deleted(self):
+        self.write("EHAMLFPG.xml", "plan")
+        self.write("other.txt", "skipped")
+        self.assertEqual(
+            self.polled(),
+            [
+                FileCreatedEvent(self.path("EHAMLFPG.xml")),
+                FileModifiedEvent(self.path("EHAMLFPG.xml")),
+            ],
+        )
+        self.write("EHAMLFPG.xml", "longer plan")
+        self.assertEqual(self.polled(), [FileModifiedEvent(self.path("EHAMLFPG.xml"))])
+        os.rename(self.path("EHAMLFPG.xml"), self.path("b738x.xml"))
+        self.assertEqual(
+            self.polled(),
+            [FileMovedEvent(self.path("EHAMLFPG.xml"), self.path("b738x.xml"))],
+        )
+        os.remove(self.path("old.xml"))
+        self.assertEqual(self.polled(), [FileDeletedEvent(self.path("old.xml"))])
+
+    def test_overwrite_between_rescans(self):
+        self.now += 200
+        self.write("old.xml", "new plan")
+        self.assertEqual(self.polled(), [FileModifiedEvent(self.path("old.xml"))])
+
+    def test_idle_poll_stats_a_slice(self):
+        for number in range(10):
+            self.write(f"plan{number}.xml", "plan")
+        self.polled()
+        self.now += 100
+        stats = []
+        real_stat = os.stat
+
+        def counted_stat(path, *args, **kwargs):
+            stats.append(path)
+            return real_stat(path, *args, **kwargs)
+
+        with patch.object(polling_observer, "COLD_SLICE", 4), patch.object(
+            polling_observer.os, "stat", counted_stat
+        ):
+            self.assertEqual(self.polled(), [])
+            # The folder and one slice of the files
+            self.assertEqual(len(stats), 1 + 4)
+            self.write("plan7.xml", "new plan")
+            events = []
+            for _ in range(3):
+                events += self.polled()
+        self.assertEqual(events, [FileModifiedEvent(self.path("plan7.xml"))])
+
+    def test_sub_folders(self):
+        os.mkdir(self.path("sub"))
+        self.write(os.path.join("sub", "LFPG.fms"), "route")
+        self.assertIn(
+            FileCreatedEvent(self.path(os.path.join("sub", "LFPG.fms"))), self.polled()
+        )
+
+    def test_interval_backs_off_when_idle(self):
+        self.emitter.interval = MIN_INTERVAL
+        self.emitter.stopped_event.wait = lambda timeout: False
+        for _ in range(10):
+            self.emitter.queue_events(0)
+        self.assertEqual(self.emitter.interval, MAX_INTERVAL)
+        self.write("EHAMLFPG.xml", "plan")
+        self.emitter.queue_events(0)
+        self.assertEqual(self.emitter.interval, MIN_INTERVAL)
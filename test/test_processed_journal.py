@@ -0,0 +1,75 @@
+"""Unit tests for processed_journal Module"""
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from processed_journal import ProcessedJournal
+
+
+class TestProcessedJournal(unittest.TestCase):
+    """test class for the journal of processed files"""
+
+    def setUp(self):
+        self.directory = pathlib.Path(tempfile.mkdtemp())
+        self.journal_file = self.directory / "config.journal"
+        self.source = self.directory / "EHAMLFPG.xml"
+        self.source.write_text("plan")
+        self.now = 1000.0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def journal(self):
+        return ProcessedJournal(self.journal_file, 1, clock=lambda: self.now)
+
+    def test_seen_after_restart(self):
+        journal = self.journal()
+        self.assertFalse(journal.seen(self.source))
+        journal.record_files([self.source])
+        journal.close()
+        journal = self.journal()
+        self.assertTrue(journal.seen(self.source))
+        # Same name, new download
+        self.source.write_text("new plan")
+        self.assertFalse(journal.seen(self.source))
+        self.source.unlink()
+        self.assertTrue(journal.seen(self.source))
+
+    def test_torn_line_is_skipped(self):
+        journal = self.journal()
+        journal.record_files([self.source])
+        journal.close()
+        with open(self.journal_file, "a", encoding="utf-8") as file:
+            file.write('[1000.0, "EHAM')
+        self.assertEqual(len(self.journal()), 1)
+
+    def test_record_after_torn_line(self):
+        journal = self.journal()
+        journal.record_files([self.source])
+        journal.close()
+        with open(self.journal_file, "a", encoding="utf-8") as file:
+            file.write('[1000.0, "EHAM')
+        other = self.directory / "KJFKKBOS.xml"
+        other.write_text("other plan")
+        journal = self.journal()
+        journal.record_files([other])
+        journal.close()
+        journal = self.journal()
+        self.assertTrue(journal.seen(self.source))
+        self.assertTrue(journal.seen(other))
+
+    def test_compact_drops_old_entries(self):
+        journal = self.journal()
+        journal.record_files([self.source])
+        self.now += 2 * 24 * 60 * 60
+        other = self.directory / "KJFKKBOS.xml"
+        other.write_text("plan")
+        journal.record_files([other])
+        self.assertEqual(journal.compact(), 1)
+        journal.record_files([self.source])
+        journal.close()
+        self.assertEqual(len(self.journal_file.read_text().splitlines()), 2)
+        self.assertEqual(len(self.journal()), 2)
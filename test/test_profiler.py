@@ -0,0 +1,56 @@
+"""Unit tests for profiler Module"""
+import pathlib
+import pstats
+import shutil
+import tempfile
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from profiler import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    """test class for profiling on demand"""
+
+    def setUp(self):
+        self.directory = pathlib.Path(tempfile.mkdtemp())
+        self.profiler = Profiler(self.directory, keep=2, interval=60)
+
+    def tearDown(self):
+        self.profiler.stop()
+        shutil.rmtree(self.directory)
+
+    def work(self, count):
+        return sorted(str(number) for number in range(count))
+
+    def test_off_writes_nothing(self):
+        work = self.profiler.wrap(self.work)
+        self.assertEqual(len(work(10)), 10)
+        self.profiler.write()
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_profile_and_allocations_written_on_stop(self):
+        self.profiler.wrap_methods(self, "work")
+        self.profiler.start()
+        self.work(1000)
+        self.profiler.stop()
+        profiles = list(self.directory.glob("sbRenamer-*.prof"))
+        self.assertEqual(len(profiles), 1)
+        functions = [name for _, _, name in pstats.Stats(str(profiles[0])).stats]
+        self.assertIn("work", functions)
+        self.assertEqual(len(list(self.directory.glob("sbRenamer-*.txt"))), 1)
+
+    def test_only_newest_files_are_kept(self):
+        for stamp in range(4):
+            (self.directory / f"sbRenamer-2026010100000{stamp}.prof").write_text("")
+        (self.directory / "log.txt").write_text("")
+        self.profiler.remove_old_files()
+        self.assertEqual(
+            sorted(path.name for path in self.directory.iterdir()),
+            [
+                "log.txt",
+                "sbRenamer-20260101000002.prof",
+                "sbRenamer-20260101000003.prof",
+            ],
+        )
@@ -0,0 +1,262 @@
+"""Unit tests for renamer_engine Module"""
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from watchdog.events import (
+    FileClosedEvent,
+    FileCreatedEvent,
+    FileModifiedEvent,
+    FileOpenedEvent,
+)
+
+# pylint: disable=missing-function-docstring
+
+from catch_up import ProcessedMarker
+from metrics import Metrics
+from renamer_engine import AsyncRenameXmlHandler, RenamerService, RenameXmlHandler
+from renamer_settings_model import RenamerSettings
+
+
+class TestEngines(unittest.TestCase):
+    """test class that runs the same files through both engines"""
+
+    def setUp(self):
+        self.directories = []
+
+    def tearDown(self):
+        for directory in self.directories:
+            shutil.rmtree(directory)
+
+    def run_engine(self, handler_class, close_write):
+        directory = pathlib.Path(tempfile.mkdtemp())
+        self.directories.append(directory)
+        config = directory / "config.ini"
+        config.write_text(
+            "[BaseSettings]\n"
+            f"source_dir = {directory}\n"
+            "file_format = b738x.xml\n"
+            "save_xml = False\n"
+            "save_existing = True\n"
+        )
+        (directory / "b738x.xml").write_text("<OFP>old plan</OFP>")
+        (directory / "EHAMLFPG.xml").write_text("<OFP>new plan</OFP>")
+        (directory / "EHAMLFPG.fms").write_text("fms plan")
+        metrics = Metrics()
+        handler = handler_class(
+            RenamerSettings(str(config)), None, close_write, metrics=metrics
+        )
+        event_class = FileClosedEvent if close_write else FileModifiedEvent
+        with self.assertNoLogs("asyncio", "ERROR"):
+            # Hold the loop, so the second event for the OFP arrives while
+            # the job for the first one is pending
+            gate = threading.Event()
+            if handler_class is AsyncRenameXmlHandler:
+                # pylint: disable-next=protected-access
+                handler._loop.call_soon_threadsafe(gate.wait, 5)
+            for name in ("EHAMLFPG.xml", "EHAMLFPG.xml", "EHAMLFPG.fms"):
+                handler.dispatch(event_class(str(directory / name)))
+            gate.set()
+            handler.stop()
+        self.assertEqual(handler.pending_jobs(), 0)
+        listing = sorted(
+            re.sub(r"_\d{14}", "_<time>", path.name) for path in directory.iterdir()
+        )
+        counts = [
+            metrics.value(name) for name in ("files_copied", "files_renamed", "backups")
+        ]
+        return listing, (directory / "b738x.xml").read_text(), counts
+
+    def test_engines_write_the_same_files(self):
+        for close_write in (False, True):
+            with self.subTest(close_write=close_write):
+                threads = self.run_engine(RenameXmlHandler, close_write)
+                self.assertEqual(
+                    threads,
+                    (
+                        [
+                            "EHAMLFPG.fms",
+                            "b738x.fms",
+                            "b738x.xml",
+                            "b738x_<time>.xml",
+                            "config.ini",
+                        ],
+                        "<OFP>new plan</OFP>",
+                        [1, 1, 1],
+                    ),
+                )
+                self.assertEqual(
+                    self.run_engine(AsyncRenameXmlHandler, close_write), threads
+                )
+
+    def test_only_modified_events_are_counted(self):
+        directory = pathlib.Path(tempfile.mkdtemp())
+        self.directories.append(directory)
+        config = directory / "config.ini"
+        config.write_text(f"[BaseSettings]\nsource_dir = {directory}\n")
+        metrics = Metrics()
+        handler = RenameXmlHandler(RenamerSettings(str(config)), None, metrics=metrics)
+        not_included = str(directory / "EHAMLFPG.txt")
+        for event_class in (FileCreatedEvent, FileOpenedEvent, FileModifiedEvent):
+            handler.dispatch(event_class(str(directory / "EHAMLFPG.xml")))
+        handler.dispatch(FileModifiedEvent(not_included))
+        handler.stop()
+        self.assertEqual(metrics.value("events_received"), 1)
+
+    def test_source_recorded_when_targets_are_written(self):
+        directory = pathlib.Path(tempfile.mkdtemp())
+        self.directories.append(directory)
+        config = directory / "config.ini"
+        config.write_text(
+            f"[BaseSettings]\nsource_dir = {directory}\nfile_format = b738x.xml\n"
+        )
+        source = directory / "EHAMLFPG.xml"
+        source.write_text("<OFP>plan</OFP>")
+        # A folder in the way of the target makes the copy fail
+        (directory / "b738x.xml").mkdir()
+        handler = RenameXmlHandler(RenamerSettings(str(config)), None, True)
+        event = FileClosedEvent(str(source))
+        handler.process_targets(event)
+        self.assertFalse(handler.journal.seen(source))
+        (directory / "b738x.xml").rmdir()
+        handler.process_targets(event)
+        self.assertTrue(handler.journal.seen(source))
+        self.assertEqual((directory / "b738x.xml").read_text(), "<OFP>plan</OFP>")
+        handler.stop()
+
+    def test_catch_up_retries_failed_targets(self):
+        directory = pathlib.Path(tempfile.mkdtemp())
+        self.directories.append(directory)
+        config = directory / "config.ini"
+        config.write_text(
+            f"[BaseSettings]\nsource_dir = {directory}\nfile_format = b738x.xml\n"
+        )
+        marker = ProcessedMarker(directory / "marker.json")
+        marker.update(directory, 0)
+        # Arrived earlier than a file that is processed, but failed
+        source = directory / "EHAMLFPG.xml"
+        source.write_text("<OFP>plan</OFP>")
+        (directory / "b738x.xml").mkdir()
+        newer = directory / "KJFKKBOS.xml"
+        newer.write_text("<OFP>newer plan</OFP>")
+        os.utime(newer, ns=(source.stat().st_mtime_ns + 10**9,) * 2)
+        handler = RenameXmlHandler(
+            RenamerSettings(str(config)), None, True, marker=marker
+        )
+        handler.process_targets(FileClosedEvent(str(source)))
+        handler.journal.record_files([newer])
+        self.assertEqual(marker.get(directory), 0)
+        (directory / "b738x.xml").rmdir()
+        self.assertEqual(handler.catch_up()["queued"], 1)
+        handler.stop()
+        self.assertEqual((directory / "b738x.xml").read_text(), "<OFP>plan</OFP>")
+        self.assertEqual(handler.catch_up()["queued"], 0)
+        self.assertEqual(marker.get(directory), 0)
+
+    def test_stalled_file_does_not_hold_its_folder(self):
+        for handler_class in (RenameXmlHandler, AsyncRenameXmlHandler):
+            with self.subTest(engine=handler_class.__name__):
+                directory = pathlib.Path(tempfile.mkdtemp())
+                self.directories.append(directory)
+                config = directory / "config.ini"
+                config.write_text(
+                    f"[BaseSettings]\nsource_dir = {directory}\n"
+                    "file_format = ICAOICOA.xml\nready_timeout = 2\n"
+                )
+                # Empty files are never ready, this one waits the whole timeout
+                (directory / "EHAMLFPG_1.xml").write_text("")
+                (directory / "KJFKKBOS_2.xml").write_text("<OFP>plan</OFP>")
+                handler = handler_class(RenamerSettings(str(config)), None)
+                started = time.monotonic()
+                for name in ("EHAMLFPG_1.xml", "KJFKKBOS_2.xml"):
+                    handler.dispatch(FileModifiedEvent(str(directory / name)))
+                while (
+                    not (directory / "KJFKKBOS.xml").exists()
+                    and time.monotonic() - started < 5
+                ):
+                    time.sleep(0.02)
+                self.assertLess(time.monotonic() - started, 1)
+                handler.stop()
+
+
+class TestRenamerService(unittest.TestCase):
+    """test class for the service with a real observer"""
+
+    def setUp(self):
+        self.directory = pathlib.Path(tempfile.mkdtemp())
+        self.first = self.directory / "first"
+        self.second = self.directory / "second"
+        self.first.mkdir()
+        self.second.mkdir()
+        config = self.directory / "config.ini"
+        config.write_text(
+            "[BaseSettings]\n"
+            f"source_dir = {self.first}\n"
+            "file_format = b738x.xml\n"
+            "save_xml = False\n"
+            "watch_config = False\n"
+        )
+        self.model = RenamerSettings(str(config))
+        self.service = RenamerService(self.model)
+
+    def tearDown(self):
+        self.service.shutdown()
+        shutil.rmtree(self.directory)
+
+    def wait_for(self, path, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not path.is_file() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return path.is_file()
+
+    def test_new_source_dir_without_restart(self):
+        self.service.start_monitoring()
+        (self.first / "EHAMLFPG.xml").write_text("<OFP>first</OFP>")
+        self.assertTrue(self.wait_for(self.first / "b738x.xml"))
+        self.model.source_dir = str(self.second)
+        self.model.save()
+        self.service.apply_saved_settings()
+        self.assertTrue(self.service.is_active_monitoring())
+        (self.second / "KJFKKBOS.xml").write_text("<OFP>second</OFP>")
+        self.assertTrue(self.wait_for(self.second / "b738x.xml"))
+        self.assertFalse((self.second / "KJFKKBOS.xml").exists())
+        # The old folder is no longer watched
+        (self.first / "LFPGEHAM.xml").write_text("<OFP>third</OFP>")
+        time.sleep(0.5)
+        self.assertEqual((self.first / "b738x.xml").read_text(), "<OFP>first</OFP>")
+
+    def test_clean_up_sweeps_do_not_overlap(self):
+        running = []
+        overlaps = []
+        sweeps = []
+        started = threading.Event()
+
+        class SlowDeleter:
+            """Deleter that notes sweeps running at the same time"""
+
+            def sweep(self):
+                if running:
+                    overlaps.append(True)
+                running.append(True)
+                started.set()
+                time.sleep(0.2)
+                sweeps.append(True)
+                running.pop()
+
+        self.service._filedeleters = [SlowDeleter()]  # pylint: disable=protected-access
+        first = threading.Thread(target=self.service.start_clean)
+        first.start()
+        started.wait(2)
+        triggers = [threading.Thread(target=self.service.start_clean) for _ in range(3)]
+        for trigger in triggers:
+            trigger.start()
+        for thread in [first] + triggers:
+            thread.join()
+        self.assertEqual(overlaps, [])
+        # The triggers during the first sweep are one more sweep
+        self.assertEqual(len(sweeps), 2)
@@ -0,0 +1,30 @@
+"""Unit tests for StartupTimer Module"""
+import unittest
+from unittest.mock import patch
+
+# pylint: disable=missing-function-docstring
+
+from startup_timer import StartupTimer
+
+
+class TestStartupTimer(unittest.TestCase):
+    """main test class for phases and reporting"""
+
+    @patch("startup_timer.time.perf_counter")
+    def test_phases_are_measured_from_previous_mark(self, mock_clock):
+        mock_clock.side_effect = [1.0, 1.5]
+        timer = StartupTimer(started=0.0)
+        timer.mark("imports")
+        timer.mark("config load")
+        self.assertEqual(timer.phases, [("imports", 1.0), ("config load", 0.5)])
+        self.assertEqual(timer.total, 1.5)
+
+    def test_report_only_when_enabled(self):
+        timer = StartupTimer()
+        timer.mark("imports")
+        with self.assertNoLogs(level="INFO"):
+            timer.report()
+        timer.enabled = True
+        with self.assertLogs(level="INFO") as logs:
+            timer.report()
+        self.assertEqual(len(logs.output), 2)
@@ -0,0 +1,110 @@
+"""Unit tests for WorkerPool Module"""
+import threading
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from worker_pool import KeyedLocks, WorkerPool
+
+
+class TestWorkerPool(unittest.TestCase):
+    """main test class for queueing and overflow"""
+
+    def setUp(self):
+        self.calls = []
+        self.gate = threading.Event()
+
+    def blocked(self, value):
+        self.gate.wait(2)
+        self.calls.append(value)
+
+    def test_jobs_are_executed(self):
+        pool = WorkerPool(2, 10)
+        for value in range(5):
+            pool.submit(self.calls.append, value)
+        pool.shutdown()
+        self.assertEqual(sorted(self.calls), [0, 1, 2, 3, 4])
+        self.assertEqual(pool.stats()["completed"], 5)
+
+    def test_thread_count_is_bounded(self):
+        before = threading.active_count()
+        pool = WorkerPool(3, 100)
+        for value in range(50):
+            pool.submit(self.blocked, value)
+        self.assertLessEqual(threading.active_count() - before, 3)
+        self.gate.set()
+        pool.shutdown()
+        self.assertEqual(len(self.calls), 50)
+
+    def test_drop_oldest(self):
+        pool = WorkerPool(1, 2, WorkerPool.DROP_OLDEST)
+        pool.submit(self.blocked, "running")
+        # wait until the worker has taken the first job
+        while pool.depth():
+            pass
+        for value in ("a", "b", "c"):
+            pool.submit(self.blocked, value)
+        self.gate.set()
+        pool.shutdown()
+        self.assertEqual(self.calls, ["running", "b", "c"])
+        self.assertEqual(pool.stats()["dropped"], 1)
+
+    def test_coalesce_same_key(self):
+        pool = WorkerPool(1, 10, WorkerPool.COALESCE)
+        pool.submit(self.blocked, "running", key="x")
+        while pool.depth():
+            pass
+        pool.submit(self.blocked, "first", key="a.xml")
+        pool.submit(self.blocked, "second", key="a.xml")
+        self.gate.set()
+        pool.shutdown()
+        self.assertEqual(self.calls, ["running", "second"])
+        self.assertEqual(pool.stats()["coalesced"], 1)
+
+    def test_same_group_runs_in_order(self):
+        pool = WorkerPool(4, 10)
+        pool.submit(self.blocked, 1, group="b738x.xml")
+        pool.submit(self.calls.append, 2, group="b738x.xml")
+        self.gate.set()
+        pool.shutdown()
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            WorkerPool(1, 1, "explode")
+
+
+class TestKeyedLocks(unittest.TestCase):
+    """test class for locks by name"""
+
+    def test_shared_key_waits_other_keys_run(self):
+        locks = KeyedLocks()
+        calls = []
+        held = threading.Event()
+        release = threading.Event()
+
+        def first():
+            with locks.hold(["b738x.xml", "EHAMLFPG.xml"]):
+                held.set()
+                release.wait(2)
+                calls.append("first")
+
+        def second(keys, name):
+            with locks.hold(keys):
+                calls.append(name)
+
+        thread = threading.Thread(target=first)
+        thread.start()
+        held.wait(2)
+        other = threading.Thread(target=second, args=(["KJFKKBOS.xml"], "other"))
+        other.start()
+        other.join(2)
+        same = threading.Thread(target=second, args=(["b738x.xml"], "same"))
+        same.start()
+        same.join(0.1)
+        self.assertEqual(calls, ["other"])
+        release.set()
+        thread.join()
+        same.join()
+        self.assertEqual(calls, ["other", "first", "same"])
+        self.assertEqual(len(locks), 0)
@@ -0,0 +1,57 @@
+"""Unit tests for xml_header Module"""
+import os
+import shutil
+import tempfile
+import unittest
+
+# pylint: disable=missing-function-docstring
+
+from xml_header import RouteCache, parse_route, read_route
+
+OFP = (
+    "<OFP><params><units>kgs</units></params>"
+    "<origin><icao_code>EHAM</icao_code><iata_code>AMS</iata_code></origin>"
+    "<destination><icao_code>LFPG</icao_code></destination>"
+    "<alternate><icao_code>LFPO</icao_code></alternate>"
+)
+
+
+class TestXmlHeader(unittest.TestCase):
+    """test class for reading the route"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "KJFKKBOS.xml")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content):
+        with open(self.path, "w", encoding="utf-8") as xml_file:
+            xml_file.write(content)
+
+    def test_route(self):
+        self.write(OFP + "</OFP>")
+        self.assertEqual(parse_route(self.path), {"orig": "EHAM", "dest": "LFPG"})
+
+    def test_stops_after_destination(self):
+        # The remainder is not well formed, it must never be parsed
+        self.write(OFP + "<notams><broken></notams>")
+        self.assertEqual(parse_route(self.path), {"orig": "EHAM", "dest": "LFPG"})
+
+    def test_no_xml(self):
+        self.write("EHAM LFPG")
+        self.assertEqual(parse_route(self.path), {})
+
+    def test_missing_file(self):
+        self.assertEqual(read_route(self.path), {})
+
+    def test_cache_survives_rename(self):
+        calls = []
+        cache = RouteCache(parse=lambda path: calls.append(path) or {"orig": "EHAM"})
+        self.write(OFP + "</OFP>")
+        cache.route(self.path)
+        renamed = os.path.join(self.directory, "b738x.xml")
+        os.rename(self.path, renamed)
+        self.assertEqual(cache.route(renamed), {"orig": "EHAM"})
+        self.assertEqual(len(calls), 1)
@@ -0,0 +1,197 @@
+"""Module with a fixed size worker pool and a bounded job queue"""
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+
+class _QueuedJob:
+    """Queued job, bookkeeping for WorkerPool only"""
+
+    __slots__ = ("method", "args", "key", "group", "queued_at")
+
+    def __init__(self, method, args, key, group, queued_at):
+        self.method = method
+        self.args = args
+        self.key = key
+        self.group = group
+        self.queued_at = queued_at
+
+
+class WorkerPool:
+    """
+    Runs jobs on a fixed number of threads
+    Jobs with the same group never run at the same time, so two downloads
+    for the same target are handled in the order they were submitted
+    When the queue is full the overflow policy decides what happens:
+    block the caller, drop the oldest queued job or coalesce with a
+    queued job for the same key (and block if there is none)
+    """
+
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+    OVERFLOW_POLICIES = [BLOCK, DROP_OLDEST, COALESCE]
+
+    def __init__(self, size, max_queue, overflow=BLOCK, name="sbRenamer-worker"):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}")
+        self._size = max(int(size), 1)
+        self._max_queue = max(int(max_queue), 1)
+        self._overflow = overflow
+        self._name = name
+        self._queue = collections.deque()
+        self._running_groups = set()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._shutdown = False
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "max_depth": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+
+    def submit(self, method, *args, key=None, group=None) -> bool:
+        """Queue method(*args), returns False when the job was not accepted"""
+        with self._condition:
+            if self._shutdown:
+                logging.warning("Worker pool stopped, not accepting %s", key)
+                return False
+            self._stats["submitted"] += 1
+            if self._overflow == self.COALESCE and key is not None:
+                for queued in self._queue:
+                    if queued.key == key:
+                        queued.method = method
+                        queued.args = args
+                        self._stats["coalesced"] += 1
+                        logging.debug("Coalesced job for %s", key)
+                        return True
+            while len(self._queue) >= self._max_queue:
+                if self._overflow == self.DROP_OLDEST:
+                    dropped = self._queue.popleft()
+                    self._stats["dropped"] += 1
+                    logging.warning("Job queue full, dropped job for %s", dropped.key)
+                else:
+                    logging.debug("Job queue full, waiting for a free slot")
+                    self._condition.wait()
+                    if self._shutdown:
+                        return False
+            self._queue.append(_QueuedJob(method, args, key, group, time.monotonic()))
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._queue))
+            self._ensure_threads()
+            self._condition.notify_all()
+        return True
+
+    def depth(self) -> int:
+        """Number of queued jobs that have not started yet"""
+        with self._condition:
+            return len(self._queue)
+
+    def stats(self) -> dict:
+        """Copy of the counters, with the current depth and average wait"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats["depth"] = len(self._queue)
+        started = stats["completed"] + stats["failed"]
+        stats["avg_wait"] = stats["total_wait"] / started if started else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        """Accept no new jobs, threads end after the queue is empty"""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _ensure_threads(self):
+        """Start threads up to the pool size, lock must be held"""
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        if len(self._threads) < self._size:
+            thread = threading.Thread(
+                target=self._run, name=f"{self._name}-{len(self._threads)}"
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self):
+        """Take the first job whose group is not running, None when shut down"""
+        with self._condition:
+            while True:
+                for queued in self._queue:
+                    if queued.group is None or queued.group not in self._running_groups:
+                        self._queue.remove(queued)
+                        if queued.group is not None:
+                            self._running_groups.add(queued.group)
+                        waited = time.monotonic() - queued.queued_at
+                        self._stats["total_wait"] += waited
+                        self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+                        self._condition.notify_all()
+                        return queued
+                if self._shutdown and not self._queue:
+                    return None
+                self._condition.wait()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                job.method(*job.args)
+                outcome = "completed"
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Job for %s failed", job.key)
+                outcome = "failed"
+            with self._condition:
+                self._stats[outcome] += 1
+                self._running_groups.discard(job.group)
+                self._condition.notify_all()
+
+
+class KeyedLocks:
+    """
+    Locks by name, created on first use and dropped when nobody holds them
+    Several names are taken in sorted order, so two holders never deadlock
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [lock, holders and waiters]
+        self._locks = {}
+
+    @contextlib.contextmanager
+    def hold(self, keys):
+        """Hold the locks of all keys for the with block"""
+        keys = sorted(set(keys))
+        with self._lock:
+            entries = [
+                self._locks.setdefault(key, [threading.Lock(), 0]) for key in keys
+            ]
+            for entry in entries:
+                entry[1] += 1
+        acquired = []
+        try:
+            for entry in entries:
+                entry[0].acquire()
+                acquired.append(entry)
+            yield
+        finally:
+            for entry in reversed(acquired):
+                entry[0].release()
+            with self._lock:
+                for key, entry in zip(keys, entries):
+                    entry[1] -= 1
+                    if not entry[1]:
+                        del self._locks[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._locks)
@@ -0,0 +1,85 @@
+"""Module to read the route from the start of a SimBrief OFP xml file
+
+Only the elements up to origin and destination are parsed, the NOTAMs and
+weather after them are never read. Results are cached on file identity so
+a file that is renamed is not parsed again
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+# route field -> element holding the icao code
+ROUTE_ELEMENTS = {"origin": "orig", "destination": "dest"}
+ICAO_ELEMENT = "icao_code"
+CACHE_SIZE = 64
+
+
+def parse_route(path):
+    """
+    Returns {"orig": .., "dest": ..} with the codes found,
+    parsing stops as soon as both are known
+    """
+    route = {}
+    stack = []
+    root = None
+    try:
+        with open(path, "rb") as xml_file:
+            for event, element in ElementTree.iterparse(
+                xml_file, events=("start", "end")
+            ):
+                if event == "start":
+                    if root is None:
+                        root = element
+                    stack.append(element.tag)
+                    continue
+                stack.pop()
+                parent = stack[-1] if stack else None
+                if element.tag == ICAO_ELEMENT and parent in ROUTE_ELEMENTS:
+                    route[ROUTE_ELEMENTS[parent]] = (element.text or "").strip()
+                    if len(route) == len(ROUTE_ELEMENTS):
+                        break
+                elif len(stack) == 1:
+                    # Done with a top level element, drop it to keep memory flat
+                    root.clear()
+    except ElementTree.ParseError as error:
+        logging.warning("Unable to read route from %s: %s", path, error)
+    return {field: code for field, code in route.items() if code}
+
+
+class RouteCache:
+    """Routes of recently read files, keyed on device, inode, size and mtime"""
+
+    def __init__(self, size=CACHE_SIZE, parse=parse_route):
+        self._size = size
+        self._parse = parse
+        self._routes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def route(self, path):
+        """Cached route of path, parsed when the file is new or changed"""
+        stat = os.stat(path)
+        identity = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if identity in self._routes:
+                self._routes.move_to_end(identity)
+                return self._routes[identity]
+        route = self._parse(path)
+        with self._lock:
+            self._routes[identity] = route
+            if len(self._routes) > self._size:
+                self._routes.popitem(last=False)
+        return route
+
+
+_ROUTES = RouteCache()
+
+
+def read_route(path):
+    """Route of path from the shared cache, empty when the file can't be read"""
+    try:
+        return _ROUTES.route(path)
+    except OSError as error:
+        logging.warning("Unable to read route from %s: %s", path, error)
+        return {}